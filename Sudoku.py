@@ -5,13 +5,35 @@ Created on Sat Aug 31 11:24:32 2024
 @author: Juan Carlos Llamas Núñez
 """
 
-import numpy as np # linear algebra
-import os # accessing directory structure
-import pandas as pd # data processing, CSV file I/O (e.g. pd.read_csv)
-from termcolor import colored
+import sys
 import time
-import copy
-import itertools
+
+from dlx import solve_dlx
+
+"""Candidate bitboards: the marks of a cell are stored as a bit mask where
+bit 'num' is set if number num+1 is still possible in that cell"""
+
+ALL_MARKS = (1 << 9) - 1
+# Number of marks in a mask and list of numbers in a mask
+POPCOUNT = tuple(bin(mask).count('1') for mask in range(1 << 9))
+NUMBERS_IN_MASK = tuple(tuple(num for num in range(9) if mask >> num & 1) for mask in range(1 << 9))
+
+class WidePopcount:
+    """POPCOUNT for masks too wide to have a table: popcount[mask]"""
+    
+    def __getitem__(self, mask):
+        return bin(mask).count('1')
+
+class WideNumbersInMask:
+    """NUMBERS_IN_MASK for masks too wide to have a table: numbers[mask]"""
+    
+    def __getitem__(self, mask):
+        numbers=[]
+        while mask:
+            lowest=mask & -mask
+            numbers.append(lowest.bit_length() - 1)
+            mask ^= lowest
+        return tuple(numbers)
 
 """Auxiliary functions"""
 
@@ -23,53 +45,178 @@ def getColumn(position):
 def getBox(position):
   return 3*(position[0]//3) + position[1]//3
 
+class Topology:
+    """Tables of the grid of a sudoku with boxes of box_size x box_size cells,
+    i.e. with size=box_size**2 rows, columns, boxes and numbers, built once
+    for each box size (see topology). Positions are (row, column) tuples and
+    cells are flat indices size*row+column"""
+    
+    def __init__(self, box_size):
+        b=box_size
+        n=b*b
+        self.box_size=b
+        self.size=n
+        self.all_marks=(1 << n) - 1
+        if n <= 9:
+          self.popcount=POPCOUNT
+          self.numbers_in_mask=NUMBERS_IN_MASK
+        else:
+          self.popcount=WidePopcount()
+          self.numbers_in_mask=WideNumbersInMask()
+        
+        self.box_positions=tuple(tuple((b*(box // b)+i, b*(box % b)+j) for i in range(b) for j in range(b)) for box in range(n))
+        self.row_positions=tuple(tuple((row, i) for i in range(n)) for row in range(n))
+        self.column_positions=tuple(tuple((i, column) for i in range(n)) for column in range(n))
+        
+        self.box_cells=tuple(tuple(n*i + j for i, j in positions) for positions in self.box_positions)
+        self.row_cells=tuple(tuple(n*i + j for i, j in positions) for positions in self.row_positions)
+        self.column_cells=tuple(tuple(n*i + j for i, j in positions) for positions in self.column_positions)
+        
+        self.box_of_cell=tuple(b*(i//b) + j//b for i in range(n) for j in range(n))
+        
+        self.other_boxes_same_row=tuple(tuple(x for x in range(b*(box//b), b*(box//b) + b) if x != box) for box in range(n))
+        self.other_boxes_same_column=tuple(tuple(x for x in range(box % b, n, b) if x != box) for box in range(n))
+        
+        # Box-line intersections: for each box, the (row, cells) and (column, cells)
+        # of the rows and columns crossing it
+        self.box_row_segments=tuple(tuple((row, tuple(c for c in self.box_cells[box] if c // n == row))
+                                          for row in range(b*(box//b), b*(box//b) + b)) for box in range(n))
+        self.box_column_segments=tuple(tuple((column, tuple(c for c in self.box_cells[box] if c % n == column))
+                                             for column in range(b*(box%b), b*(box%b) + b)) for box in range(n))
+        
+        # For each cell, the flat indices of the cells sharing its row, column or box
+        self.peers=tuple(tuple(sorted(set(self.row_cells[i] + self.column_cells[j] + self.box_cells[self.box_of_cell[n*i + j]])
+                                      - {n*i + j}))
+                         for i in range(n) for j in range(n))
+        self.peer_sets=tuple(frozenset(peers) for peers in self.peers)
+        
+        # Every (number, unit) pair, units being boxes, rows or columns
+        self.all_number_unit_pairs=tuple((num, unit) for num in range(n) for unit in range(n))
+        
+        # Largest obvious and hidden sets looked for. Up to 9x9 every obvious
+        # set is checked and, as the larger hidden sets are complements of
+        # obvious sets, only the hidden pairs; on bigger grids both are
+        # limited to quads, which keeps the number of subsets polynomial
+        self.max_obvious_set=n - 3 if n <= 9 else 4
+        self.max_hidden_set=2 if n <= 9 else 4
+        # Inside a supposition the bigger grids only look for pairs: the
+        # larger sets cost more there than the branches they save
+        self.max_obvious_set_in_search=self.max_obvious_set if n <= 9 else 2
+        self.max_hidden_set_in_search=self.max_hidden_set if n <= 9 else 2
+        # Largest fish looked for: 2 (X-Wing), 3 (Swordfish) and 4 (Jellyfish)
+        self.max_fish=4
+
+_TOPOLOGIES = {}
+
+def topology(box_size):
+  """Topology of the sudokus with boxes of box_size x box_size cells"""
+  if box_size not in _TOPOLOGIES:
+    _TOPOLOGIES[box_size]=Topology(box_size)
+  return _TOPOLOGIES[box_size]
+
+"""Topology of the classic 9x9 grid, kept as module constants"""
+
+TOPOLOGY = topology(3)
+
+BOX_POSITIONS = TOPOLOGY.box_positions
+ROW_POSITIONS = TOPOLOGY.row_positions
+COLUMN_POSITIONS = TOPOLOGY.column_positions
+
+BOX_CELLS = TOPOLOGY.box_cells
+ROW_CELLS = TOPOLOGY.row_cells
+COLUMN_CELLS = TOPOLOGY.column_cells
+
+BOX_OF_CELL = TOPOLOGY.box_of_cell
+
+OTHER_BOXES_SAME_ROW = TOPOLOGY.other_boxes_same_row
+OTHER_BOXES_SAME_COLUMN = TOPOLOGY.other_boxes_same_column
+
+BOX_ROW_SEGMENTS = TOPOLOGY.box_row_segments
+BOX_COLUMN_SEGMENTS = TOPOLOGY.box_column_segments
+
+PEERS = TOPOLOGY.peers
+
+ALL_NUMBER_UNIT_PAIRS = TOPOLOGY.all_number_unit_pairs
+
 """Given a certain row, column and box, get all the cells in that row,
  column and box"""
 def positions_box(box):
-  positions=[]
-  for i in range(3):
-    for j in range(3):
-      positions.append([3*(box // 3)+i,3*(box % 3)+j])
-  return positions
+  return BOX_POSITIONS[box]
 def positions_row(row):
-  return [[row,i] for i in range(9)]
+  return ROW_POSITIONS[row]
 def positions_column(column):
-  return [[i,column] for i in range(9)]
+  return COLUMN_POSITIONS[column]
 
 def other_two_boxes_same_row(box):
-    return [i for i in [3*(box//3) + i for i in range(3)] if i!= box]
+    return OTHER_BOXES_SAME_ROW[box]
 
 def other_two_boxes_same_column(box):
-    return [i for i in [box%3+ 3*i for i in range(3)] if i!= box]
+    return OTHER_BOXES_SAME_COLUMN[box]
+
+
+"""Sudoku strings. A sudoku of size n (n rows of n cells) is written row by
+row, either with one character per cell or, for numbers of several digits,
+with the cells separated by spaces or commas. Empty cells are 0 or '.'.
+In the one-character form the numbers after 9 are the letters A, B, C...
+(A is 10), so a 16x16 sudoku can be written with 256 characters"""
+
+SYMBOLS = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+def sudoku_cells(sudoku_string):
+  """List of the cells of a sudoku string: the number as a string ('1',
+  '2', ..., '10', ...) or '0' for an empty cell. Whitespace around the
+  string, like the end of a line read from a file, is ignored"""
+  sudoku_string=sudoku_string.strip()
+  if ',' in sudoku_string or any(c.isspace() for c in sudoku_string):
+    tokens=sudoku_string.replace(',', ' ').split()
+    return ['0' if token == '.' else str(int(token)) for token in tokens]
+  if len(sudoku_string) == 81:
+    cells=list(sudoku_string.replace('.', '0'))
+    for c in cells:
+      if c not in '0123456789':
+        raise ValueError('Invalid character ' + repr(c) + ' in a sudoku string')
+    return cells
+  return ['0' if c in '0.' else str(SYMBOLS.index(c.upper()) + 1) for c in sudoku_string]
+
+def box_size_of(n_cells):
+  """Box size of a sudoku with n_cells cells (3 for 81 cells)"""
+  box_size=round(n_cells ** 0.25)
+  if box_size < 1 or box_size**4 != n_cells:
+    raise ValueError('A sudoku must have box_size**4 cells (81, 256, 625...), not ' + str(n_cells))
+  return box_size
 
 def string_to_grid(sudoku_string):
   """Parse from string to grid"""
+  cells=sudoku_cells(sudoku_string)
+  n=box_size_of(len(cells))**2
   sudoku_grid = []
-  for i in range(9):
+  for i in range(n):
     sudoku_grid.append([])
-    for j in range(9):
-      sudoku_grid[i].append(sudoku_string[0])
-      sudoku_string=sudoku_string[1:]
+    for j in range(n):
+      sudoku_grid[i].append(cells[n*i + j])
   return sudoku_grid
 
 
 def grid_to_string(sudoku_grid):
-  """Parse from grid to string"""
+  """Parse from grid to string. Grids bigger than 9x9 are written with the
+  cells separated by spaces"""
   sudoku_string = []
-  for i in range(9):
-    for j in range(9):
+  for i in range(len(sudoku_grid)):
+    for j in range(len(sudoku_grid)):
       sudoku_string.append(sudoku_grid[i][j])
-  return ''.join(sudoku_string)
+  return ''.join(sudoku_string) if len(sudoku_grid) <= 9 else ' '.join(sudoku_string)
 
-def only_one_place_availabe_for_num_in_cells(cells, num, marks):
+def only_one_place_availabe_for_num_in_cells(cells, num, marks, topology=TOPOLOGY):
   """If there is only one place in the set of positions 'cells' where 'num' is
-  available given the restrictions in 'marks', returns that position.
+  available given the restrictions in 'marks' (the list of candidate masks
+  of the 81 cells, or of the cells of 'topology'), returns that position.
   Otherwise returns -1"""
   places=0
   key_position=[]
+  bit=1 << num
+  n=topology.size
   for position in cells:
-    if marks[position[0]][position[1]][num]:
+    if marks[n*position[0] + position[1]] & bit:
       places=places+1
       key_position=position
   if places==1:
@@ -77,109 +224,740 @@ def only_one_place_availabe_for_num_in_cells(cells, num, marks):
   else:
     return -1
 
-def only_one_num_availabe_in_cell(i,j,marks):
+def only_one_cell_available_for_num(cells, bit, marks):
+  """Same as only_one_place_availabe_for_num_in_cells with flat cell indices
+  and the mask 'bit' of the number. Returns the cell or -1"""
+  key_cell=-1
+  for cell in cells:
+    if marks[cell] & bit:
+      if key_cell != -1:
+        return -1
+      key_cell=cell
+  return key_cell
+
+def only_one_num_availabe_in_cell(i,j,marks, topology=TOPOLOGY):
   """If there is only one number avaliable in cell (i,j) given the
-  restrictions in 'marks', returns that number.
+  restrictions in 'marks' (the list of candidate masks of the 81 cells, or
+  of the cells of 'topology'), returns that number.
   Otherwise returns -1"""
-  
-  numbers=0
-  number=-1
-  for num in range(9):
-    if marks[i][j][num]:
-      numbers=numbers+1
-      number=num
-  if numbers==1:
-    return number
+  mask=marks[topology.size*i + j]
+  if topology.popcount[mask]==1:
+    return topology.numbers_in_mask[mask][0]
   else:
     return -1
 
-def obvious_set(n, positions, marks):
+def union_of(marks, cells):
+  """Union of the candidate masks of some cells"""
+  union=0
+  for cell in cells:
+    union |= marks[cell]
+  return union
+
+def subsets_with_union(masks, n, popcount=POPCOUNT):
+  """Yields, in the order of itertools.combinations, the tuples of 'n' indices
+  of 'masks' whose union has exactly 'n' bits set, together with that union.
+  Partial subsets whose union already has more than 'n' bits are pruned.
+  'popcount' counts the bits of a mask (see Topology)"""
+  k=len(masks)
+  stack=[(0, (), 0)]
+  while stack:
+    start, chosen, union = stack.pop()
+    if len(chosen)==n:
+      if popcount[union]==n:
+        yield chosen, union
+      continue
+    # Pushed in reverse so that they are popped in lexicographic order
+    for index in range(k - n + len(chosen), start - 1, -1):
+      new_union = union | masks[index]
+      if popcount[new_union] <= n:
+        stack.append((index + 1, chosen + (index,), new_union))
+
+def obvious_set(n, positions, marks, topology=TOPOLOGY):
   """Checks if there is a subset of 'n' elements in 'positions'
   whose set of marked numbers has size 'n'. If so checks if there
   is any of this marks in the complementary subset of cells.
   If this is the case, the marks in the complementary set have to be removed 
   and the set of cells, the set of marks and the set of remove marks are
-  returned. otherwise, None is returned"""
+  returned. otherwise, None is returned.
+  'marks' is the list of candidate masks of the 81 cells (or of the cells
+  of 'topology')"""
   
-  for subset in itertools.combinations(positions, n):
-      numbers_in_subset=set({})
-      for element in subset:
-        for num in range(9):
-          if marks[element[0]][element[1]][num]:
-            numbers_in_subset.add(num)
-      if len(numbers_in_subset)==n:
-        removed_marks=[]
-        for pos in positions:
-          if pos not in subset:
-            for num in numbers_in_subset:
-              if marks[pos[0]][pos[1]][num]:
-                marks[pos[0]][pos[1]][num]=False
-                removed_marks.append((pos,num))
-        if len(removed_marks)>0:
-          return {'subset': subset, 'numbers_in_subset': numbers_in_subset, 'removed_marks': removed_marks}
+  if n==0:
+    return
+  indices=[topology.size*pos[0] + pos[1] for pos in positions]
+  for chosen, union in subsets_with_union([marks[index] for index in indices], n, topology.popcount):
+    numbers_in_subset=set(topology.numbers_in_mask[union])
+    removed_marks=[]
+    for k in range(len(positions)):
+      if k not in chosen and marks[indices[k]] & union:
+        for num in numbers_in_subset:
+          if marks[indices[k]] >> num & 1:
+            marks[indices[k]] &= ~(1 << num)
+            removed_marks.append((positions[k],num))
+    if len(removed_marks)>0:
+      return {'subset': tuple(positions[k] for k in chosen), 'numbers_in_subset': numbers_in_subset, 'removed_marks': removed_marks}
+  return
+
+def hidden_set(n, positions, marks, topology=TOPOLOGY):
+  """Checks if there is a set of 'n' numbers that can only be placed in 'n'
+  of the cells in 'positions'. If so, those cells cannot hold any other number
+  and the rest of their marks have to be removed. Returns the same dictionary
+  as obvious_set (the cells, the numbers and the removed marks) or None.
+  It works on the dual masks: for each number, the positions where it is marked"""
+  
+  numbers_in_mask=topology.numbers_in_mask
+  indices=[topology.size*pos[0] + pos[1] for pos in positions]
+  places=[0]*topology.size
+  for k, index in enumerate(indices):
+    for num in numbers_in_mask[marks[index]]:
+      places[num] |= 1 << k
+  numbers=[num for num in range(topology.size) if places[num]]
+  for chosen, union in subsets_with_union([places[num] for num in numbers], n, topology.popcount):
+    numbers_mask=0
+    for c in chosen:
+      numbers_mask |= 1 << numbers[c]
+    removed_marks=[]
+    for k in numbers_in_mask[union]:
+      for num in numbers_in_mask[marks[indices[k]] & ~numbers_mask]:
+        removed_marks.append((positions[k],num))
+      marks[indices[k]] &= numbers_mask
+    if len(removed_marks)>0:
+      return {'subset': tuple(positions[k] for k in numbers_in_mask[union]),
+              'numbers_in_subset': [numbers[c] for c in chosen], 'removed_marks': removed_marks}
   return
 
+def places_in_units(marks, topology=TOPOLOGY):
+  """Masks of the places of each number in each unit: places[u][num][unit]
+  has bit k set if number num+1 is marked in the k-th cell of the unit, u
+  being 0 for the boxes, 1 for the rows and 2 for the columns (the k-th cell
+  of a row is its column k and the k-th cell of a column its row k)"""
+  size=topology.size
+  b=topology.box_size
+  numbers_in_mask=topology.numbers_in_mask
+  box_of_cell=topology.box_of_cell
+  in_boxes=[[0]*size for num in range(size)]
+  in_rows=[[0]*size for num in range(size)]
+  in_columns=[[0]*size for num in range(size)]
+  for index, mask in enumerate(marks):
+    row, column = index//size, index%size
+    box, k = box_of_cell[index], b*(row % b) + column % b
+    for num in numbers_in_mask[mask]:
+      in_boxes[num][box] |= 1 << k
+      in_rows[num][row] |= 1 << column
+      in_columns[num][column] |= 1 << row
+  return in_boxes, in_rows, in_columns
+
+def fish(num, line, places, marks, placed, topology=TOPOLOGY):
+  """Checks if there are n rows (line=0) or columns (line=1) where number
+  num+1 can only be placed in the same n columns (rows): it then has to be
+  in those crossings, so its marks in the rest of the cover columns (rows)
+  have to be removed. n=2 is an X-Wing, n=3 a Swordfish and n=4 a Jellyfish,
+  and the smaller ones are looked for first. 'places' are the masks of the
+  places of the number in each row (column), see places_in_units, and
+  'placed' the masks of the numbers placed in each row (column). Returns a
+  dictionary with the base lines, the cover lines and the removed positions,
+  or None"""
+  size=topology.size
+  bit=1 << num
+  popcount=topology.popcount
+  free=[base for base in range(size) if not placed[base] & bit]
+  # A fish of n of the free lines is also a fish of the other free lines in
+  # the other direction, so only the smaller half of the sizes is looked for
+  cover_cells=topology.row_cells if line else topology.column_cells
+  for n in range(2, min(topology.max_fish, len(free)//2)+1):
+    lines=[base for base in free if popcount[places[base]] <= n]
+    for chosen, union in subsets_with_union([places[base] for base in lines], n, popcount):
+      bases={lines[c] for c in chosen}
+      removed=[]
+      for cover in topology.numbers_in_mask[union]:
+        for k, cell in enumerate(cover_cells[cover]):
+          if k not in bases and marks[cell] & bit:
+            marks[cell] &= ~bit
+            removed.append((cell//size, cell%size))
+      if len(removed)>0:
+        return {'size': n, 'lines': sorted(bases), 'cover_lines': list(topology.numbers_in_mask[union]),
+                'removed': removed}
+  return
+
+def remove_from_common_peers(cells, num, marks, topology=TOPOLOGY):
+  """Removes the marks of number num+1 from the cells that see every cell of
+  'cells' (flat indices). Returns the positions changed"""
+  size=topology.size
+  bit=1 << num
+  common=topology.peer_sets[cells[0]].intersection(*[topology.peer_sets[cell] for cell in cells[1:]])
+  removed=[]
+  for cell in sorted(common):
+    if marks[cell] & bit:
+      marks[cell] &= ~bit
+      removed.append((cell//size, cell%size))
+  return removed
+
+def xy_wing(marks, topology=TOPOLOGY):
+  """Checks if there is a cell with two marks {x,y} (the pivot) that sees a
+  cell with marks {x,z} and a cell with marks {y,z} (the wings): one of the
+  wings is z, so z has to be removed from the cells that see both wings.
+  Returns a dictionary with the pivot, the wings, the number z and the
+  removed positions, or None"""
+  size=topology.size
+  popcount=topology.popcount
+  for pivot, mask in enumerate(marks):
+    if popcount[mask] != 2:
+      continue
+    for wing in topology.peers[pivot]:
+      shared=marks[wing] & mask
+      if popcount[marks[wing]] != 2 or popcount[shared] != 1:
+        continue
+      z_bit=marks[wing] & ~mask
+      other_mask=(mask & ~shared) | z_bit
+      for other in topology.peers[pivot]:
+        if other > wing and marks[other] == other_mask:
+          z=topology.numbers_in_mask[z_bit][0]
+          removed=remove_from_common_peers([wing, other], z, marks, topology)
+          if len(removed)>0:
+            return {'pivot': (pivot//size, pivot%size), 'wings': [(wing//size, wing%size), (other//size, other%size)],
+                    'number': z, 'removed': removed}
+  return
+
+def xyz_wing(marks, topology=TOPOLOGY):
+  """Checks if there is a cell with three marks {x,y,z} (the pivot) that
+  sees a cell with marks {x,z} and a cell with marks {y,z} (the wings): one
+  of the three cells is z, so z has to be removed from the cells that see
+  the pivot and both wings. Returns the same dictionary as xy_wing or None"""
+  size=topology.size
+  popcount=topology.popcount
+  for pivot, mask in enumerate(marks):
+    if popcount[mask] != 3:
+      continue
+    for wing in topology.peers[pivot]:
+      if popcount[marks[wing]] != 2 or marks[wing] & ~mask:
+        continue
+      for other in topology.peers[pivot]:
+        other_mask=marks[other]
+        if (other > wing and popcount[other_mask] == 2 and not other_mask & ~mask
+            and marks[wing] | other_mask == mask and popcount[marks[wing] & other_mask] == 1):
+          z=topology.numbers_in_mask[marks[wing] & other_mask][0]
+          removed=remove_from_common_peers([pivot, wing, other], z, marks, topology)
+          if len(removed)>0:
+            return {'pivot': (pivot//size, pivot%size), 'wings': [(wing//size, wing%size), (other//size, other%size)],
+                    'number': z, 'removed': removed}
+  return
+
+def simple_coloring(num, places, marks, placed_boxes, placed_rows, placed_columns, topology=TOPOLOGY):
+  """Simple coloring of number num+1. The units where the number has only two
+  places link those cells: exactly one of them holds the number, so the
+  cells of each chain of links are colored alternately with two colors, one
+  of which is the true one. If two cells of the same color see each other
+  that color is false and the number is removed from all its cells (a color
+  wrap); otherwise the number is removed from the cells that see both colors
+  (a color trap). 'places' are the masks of the places of the number in
+  each box, row and column (see places_in_units) and 'placed_*' the masks of
+  the numbers placed in each unit. Returns a dictionary with the two colors, the false color (0, 1 or
+  None for a trap) and the removed positions, or None"""
+  size=topology.size
+  bit=1 << num
+  popcount=topology.popcount
+  numbers_in_mask=topology.numbers_in_mask
+  box_of_cell=topology.box_of_cell
+  links={}
+  for unit_places, placed, units in zip(places, (placed_boxes, placed_rows, placed_columns),
+                                        (topology.box_cells, topology.row_cells, topology.column_cells)):
+    for unit, mask in enumerate(unit_places):
+      if popcount[mask] == 2 and not placed[unit] & bit:
+        a, b = [units[unit][k] for k in numbers_in_mask[mask]]
+        links.setdefault(a, []).append(b)
+        links.setdefault(b, []).append(a)
+  color={}
+  for start in sorted(links):
+    if start in color:
+      continue
+    # Chain of the linked cells from 'start', colored 0 and 1 alternately
+    color[start]=0
+    chain=[start]
+    for cell in chain:
+      for linked in links[cell]:
+        if linked not in color:
+          color[linked]=1 - color[cell]
+          chain.append(linked)
+    if len(chain) < 3:
+      continue
+    colors=[[cell for cell in chain if color[cell] == c] for c in (0, 1)]
+    # Units (box, row and column, numbered apart) of the cells of each color
+    seen=[{unit for cell in cells for unit in (box_of_cell[cell], size + cell//size, 2*size + cell%size)}
+          for cells in colors]
+    false_color=None
+    for c in (0, 1):
+      # Two cells of the color see each other if they share a unit
+      if len(seen[c]) < 3*len(colors[c]):
+        false_color=c
+        break
+    removed=[]
+    if false_color is not None:
+      targets=sorted(colors[false_color])
+    else:
+      chain_cells=set(chain)
+      targets=[]
+      for row, mask in enumerate(places[1]):
+        if not placed_rows[row] & bit:
+          for column in numbers_in_mask[mask]:
+            cell=size*row + column
+            box=box_of_cell[cell]
+            if (cell not in chain_cells and (box in seen[0] or size + row in seen[0] or 2*size + column in seen[0])
+                and (box in seen[1] or size + row in seen[1] or 2*size + column in seen[1])):
+              targets.append(cell)
+    for cell in targets:
+      marks[cell] &= ~bit
+      removed.append((cell//size, cell%size))
+    if len(removed)>0:
+      return {'colors': [[(cell//size, cell%size) for cell in sorted(cells)] for cells in colors],
+              'false_color': false_color, 'removed': removed}
+  return
+
+"""Explanation of the solution: each step is recorded as a dictionary with
+a 'rule' key and the units, numbers and cells involved (0-based), and it is
+only turned into text when it is printed or rendered"""
+
+LINE_NAMES = ('row', 'column')
+GRID_STEPS = ('original', 'single', 'solution') # steps shown with the grid
+FISH_NAMES = {2: 'X-Wing', 3: 'Swordfish', 4: 'Jellyfish'}
+
+def render_step(step):
+  """Explanation message of a step"""
+  rule=step['rule']
+  if rule == 'original':
+    return 'Original Sudoku'
+  if rule == 'solution':
+    return 'Solution'
+  if rule == 'solved':
+    return 'The sudoku has been solved in '+str(step['seconds'])+' seconds!'
+  if rule == 'single':
+    i, j = step['cell']
+    if step['unit'] == 'cell':
+      return 'The only possible correct number in cell ('+str(i+1)+','+str(j+1)+') is '+ str(step['number']+1)
+    return ('There is only a cell where it is possible to put number '+str(step['number']+1)+' in '+step['unit']+' '+
+            str(step['index']+1))
+  if rule == 'pointing_pair':
+    line=step['line']
+    return ("Boxes " + str(step['box']+1) + " and " + str(step['other_box']+1) +
+            " share pointing marked " + line + "s " + str([i+1 for i in step['lines']]) +
+            " for number " + str(step['number']+1) + " so all the marks for number " +
+            str(step['number']+1) + " in " + line + "(s) " + str([i+1 for i in step['target_lines']]) +
+            " of box " + str(step['target_box']+1) +
+            " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+  if rule == 'pointing_line':
+    line=step['line']
+    return ("Box " + str(step['box']+1) + " has only a pointing marked " + line + " " +
+            str([i+1 for i in step['lines']]) + " for number " + str(step['number']+1) +
+            " so all the marks for number " + str(step['number']+1) + " in " + line + " " +
+            str([i+1 for i in step['lines']]) + " of boxes " + str([b+1 for b in step['target_boxes']]) +
+            " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+  if rule == 'obvious_set':
+    unit=step['unit']
+    return (unit.capitalize() + " " + str(step['index']+1) + " has a set of " + str(len(step['cells'])) + " cells " +
+            str([[pos[0]+1,pos[1]+1] for pos in step['cells']]) +
+            " where the only marks are " + str([i+1 for i in step['numbers']]) +
+            " so no marks of those numbers are possible in the other cells of the " + unit +
+            ", i.e., the following marks should be removed " +
+            str([([pos[0]+1,pos[1]+1],num+1) for (pos,num) in step['removed']]))
+  if rule == 'hidden_set':
+    unit=step['unit']
+    return (unit.capitalize() + " " + str(step['index']+1) + " has a set of " + str(len(step['numbers'])) + " numbers " +
+            str([i+1 for i in step['numbers']]) + " that can only be placed in the cells " +
+            str([[pos[0]+1,pos[1]+1] for pos in step['cells']]) +
+            " so no other numbers are possible in those cells" +
+            ", i.e., the following marks should be removed " +
+            str([([pos[0]+1,pos[1]+1],num+1) for (pos,num) in step['removed']]))
+  if rule == 'fish':
+    line=step['line']
+    cover='column' if line == 'row' else 'row'
+    return (FISH_NAMES[step['size']] + ": in " + line + "s " + str([i+1 for i in step['lines']]) +
+            " number " + str(step['number']+1) + " can only be placed in " + cover + "s " +
+            str([i+1 for i in step['cover_lines']]) + " so all the marks for number " + str(step['number']+1) +
+            " in the other cells of those " + cover + "s shall be removed, i.e." +
+            str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+  if rule in ('xy_wing', 'xyz_wing'):
+    pivot=step['pivot']
+    xy=rule == 'xy_wing'
+    return (("XY-Wing" if xy else "XYZ-Wing") + ": cell " + str([pivot[0]+1,pivot[1]+1]) +
+            " and its wings " + str([[pos[0]+1,pos[1]+1] for pos in step['wings']]) +
+            " force number " + str(step['number']+1) + " in " + ("one of the wings" if xy else "one of the three cells") +
+            ", so all the marks for number " + str(step['number']+1) + " in the cells that see " +
+            ("both wings" if xy else "all three") +
+            " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+  if rule == 'simple_coloring':
+    colors=[str([[pos[0]+1,pos[1]+1] for pos in cells]) for cells in step['colors']]
+    text=("Simple coloring of number " + str(step['number']+1) + ": the chain of cells where it has only two places"
+          " in a unit is colored " + colors[0] + " and " + colors[1])
+    if step['false_color'] is None:
+      return (text + ", one of which holds the number, so all the marks for number " + str(step['number']+1) +
+              " in the cells that see both colors shall be removed, i.e." +
+              str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+    return (text + ", and two cells of " + colors[step['false_color']] + " see each other, so all the marks for number " +
+            str(step['number']+1) + " in that color shall be removed, i.e." +
+            str([[pos[0]+1,pos[1]+1] for pos in step['removed']]))
+  if rule == 'branch':
+    i, j = step['cell']
+    return 'The possible values for cell ('+str(i+1)+', '+str(j+1)+') are: '+str([num+1 for num in step['numbers']])
+  if rule == 'suppose':
+    i, j = step['cell']
+    return '  * Let\'s suppose that the correct number in cell ('+str(i+1)+','+str(j+1)+') is '+str(step['number']+1)
+  if rule == 'contradiction':
+    i, j = step['cell']
+    return ('  It leads to the sudoku being unsolvable, so mark '+
+            str(step['number']+1)+' is removed from cell ('+str(i+1)+','+str(j+1)+')')
+  if rule == 'supposition_solved':
+    return '  This supposition leads to a complete grid'
+  if rule == 'wrong_number':
+    i, j = step['cell']
+    return 'The number '+str(step['number']+1)+' in cell ('+str(i+1)+','+str(j+1)+') is not correct'
+  if rule == 'unsolvable':
+    return 'The sudoku has no solution from the current grid'
+  if rule == 'budget_exceeded':
+    return ('The search has been stopped after ' + str(step['nodes']) + ' suppositions, the limit ' +
+            step['limit'] + ' has been reached')
+  if rule == 'ill_posed':
+    return 'There are more than one possible solution so the sudoku is ill-posed: ' + str(step['solutions'])
+  raise ValueError('Unknown rule ' + repr(rule))
+
+def render_grid(sudoku_grid, sudoku_grid_original, i=-1, j=-1, indentation=''):
+  """Colored text of the grid: the original numbers in black, the ones found
+  in blue and cell (i,j) in magenta"""
+  black='\033[90m'
+  blue='\033[94m'
+  magenta='\033[95m'
+  n=len(sudoku_grid)
+  box_size=round(n ** 0.5)
+  width=len(str(n)) # numbers are right aligned in cells of this width
+  line=black + '-'*((width + 1)*n + 2*box_size + 1) + black + '\n'
+  text=[]
+  for row in range(n):
+    text.append(indentation)
+    if row % box_size==0:
+      text.append(line)
+      text.append(indentation)
+    for column in range(n):
+      if column % box_size==0:
+        text.append(black +'|'+ black + ' ')
+      number=sudoku_grid[row][column].rjust(width)
+      if sudoku_grid_original[row][column] != '0':
+        text.append(black + number + black + ' ')
+      elif i==row and j==column:
+        text.append(magenta + number + magenta + ' ')
+      elif sudoku_grid[row][column] == '0':
+        text.append(' '*(width + 1))
+      else:
+        text.append(blue + number + blue + ' ')
+    text.append(black +'|'+ black + '\n')
+  text.append(indentation)
+  text.append(line)
+  return ''.join(text)
+
+def render_steps(steps, sudoku_string_original, indentation=''):
+  """Text of a recorded explanation, the same that solve_sudoku prints"""
+  sudoku_grid_original=string_to_grid(sudoku_string_original)
+  sudoku_grid=string_to_grid(sudoku_string_original)
+  text=[]
+  for step in steps:
+    if step['rule'] == 'single':
+      i, j = step['cell']
+      sudoku_grid[i][j]=str(step['number']+1)
+    elif step['rule'] == 'solution':
+      sudoku_grid=string_to_grid(step['solution'])
+    text.append(indentation + render_step(step) + '\n')
+    if step['rule'] in GRID_STEPS:
+      i, j = step.get('cell', (-1, -1))
+      text.append(render_grid(sudoku_grid, sudoku_grid_original, i, j, indentation))
+  return ''.join(text)
+
+class SolverStats:
+    """Counters of a call to Sudoku.solve_sudoku with stats=True. For each
+    rule, 'evaluated' is the number of times it has been tested, 'fired' the
+    times it placed a number or removed marks and 'seconds' the wall time
+    spent testing it. The two kinds of pointing test are counted separately,
+    but their time is counted together under 'pointing'. 'branches' is the
+    number of suppositions tried by the back tracking, 'max_depth' its
+    deepest level of nested suppositions and 'snapshots' the states saved
+    to be restored (the branches are explored in place, so no Sudoku
+    instances are created). 'backtracking_seconds' is the wall time of the
+    back tracking itself, choosing the cells and saving and restoring the
+    states, without the rules tested inside the suppositions"""
+    
+    RULES=('box_single', 'row_single', 'column_single', 'cell_single',
+           'pointing', 'pointing_pair', 'pointing_line', 'obvious_set', 'hidden_set',
+           'fish', 'xy_wing', 'xyz_wing', 'simple_coloring')
+    
+    def __init__(self):
+        self.evaluated=dict.fromkeys(self.RULES, 0)
+        self.fired=dict.fromkeys(self.RULES, 0)
+        self.seconds=dict.fromkeys(self.RULES, 0.0)
+        self.branches=0
+        self.max_depth=0
+        self.snapshots=0
+        self.backtracking_seconds=0.0
+        self.total_seconds=0.0
+    
+    def count(self, rule, fired, seconds=0.0):
+        """Adds an evaluation of 'rule'"""
+        self.evaluated[rule] += 1
+        if fired:
+          self.fired[rule] += 1
+        self.seconds[rule] += seconds
+    
+    def as_dict(self):
+        return {'rules': {rule: {'evaluated': self.evaluated[rule], 'fired': self.fired[rule],
+                                 'seconds': self.seconds[rule]} for rule in self.RULES},
+                'branches': self.branches, 'max_depth': self.max_depth,
+                'snapshots': self.snapshots, 'backtracking_seconds': self.backtracking_seconds,
+                'total_seconds': self.total_seconds}
+    
+    def __repr__(self):
+        fired=', '.join(rule + '=' + str(self.fired[rule]) for rule in self.RULES if self.fired[rule])
+        return ('SolverStats(fired: ' + fired + '; branches=' + str(self.branches) +
+                ', max_depth=' + str(self.max_depth) + ')')
+
+class BudgetExceeded(Exception):
+    """Raised inside the search when a limit of its SearchBudget is reached"""
+
+class SearchBudget:
+    """Limits of a call to Sudoku.solve_sudoku: 'max_nodes' suppositions of
+    the back tracking, 'max_time' seconds and 'max_memory' bytes of search
+    state. The search works in place and keeps one snapshot (see save_state)
+    per level of nested suppositions, all of the same size, and the solutions
+    found, so its memory is estimated as the snapshots alive times the size
+    of one of them plus the size of the solutions. 'nodes', 'solutions',
+    'seconds' and 'memory' (the peak estimate) are counted and 'exceeded' is
+    the name of the limit that stopped the search, or None"""
+    
+    LIMITS=('max_nodes', 'max_time', 'max_memory')
+    
+    def __init__(self, max_nodes=None, max_time=None, max_memory=None):
+        self.max_nodes=max_nodes
+        self.max_time=max_time
+        self.max_memory=max_memory
+        self.nodes=0
+        self.solutions=0
+        self.seconds=0.0
+        self.memory=0
+        self.state_bytes=0
+        self.solution_bytes=0
+        self.exceeded=None
+        self.start=time.perf_counter()
+    
+    def check_node(self, snapshots):
+        """Counts a node of the search, with 'snapshots' saved states alive.
+        Raises BudgetExceeded if a limit is reached"""
+        self.nodes += 1
+        self.seconds=time.perf_counter() - self.start
+        memory=snapshots*self.state_bytes + self.solutions*self.solution_bytes
+        self.memory=max(self.memory, memory)
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+          self.exceeded='max_nodes'
+        elif self.max_time is not None and self.seconds > self.max_time:
+          self.exceeded='max_time'
+        elif self.max_memory is not None and memory > self.max_memory:
+          self.exceeded='max_memory'
+        if self.exceeded is not None:
+          raise BudgetExceeded(self.exceeded)
+    
+    def as_dict(self):
+        return {'max_nodes': self.max_nodes, 'max_time': self.max_time, 'max_memory': self.max_memory,
+                'nodes': self.nodes, 'solutions': self.solutions, 'seconds': self.seconds, 'memory': self.memory,
+                'exceeded': self.exceeded}
+    
+    def __repr__(self):
+        return ('SearchBudget(nodes=' + str(self.nodes) + ', solutions=' + str(self.solutions) + ', seconds=' + str(round(self.seconds, 6)) +
+                ', memory=' + str(self.memory) + ', exceeded=' + str(self.exceeded) + ')')
+
+def state_bytes(state):
+    """Bytes of a snapshot taken with Sudoku.save_state, not counting the
+    small integers and strings it shares with the sudoku"""
+    candidates, rows, columns, boxes, sudoku_grid, queue = state
+    return (sys.getsizeof(state) + sys.getsizeof(candidates) + sys.getsizeof(rows) + sys.getsizeof(columns) +
+            sys.getsizeof(boxes) + sys.getsizeof(sudoku_grid) + sum(sys.getsizeof(row) for row in sudoku_grid) +
+            sys.getsizeof(queue) + sum(sys.getsizeof(q) for q in queue))
+
+class Solutions(list):
+    """List of solutions returned by Sudoku.solve_sudoku. The recorded
+    explanation, if any, is in 'steps', the SolverStats, if requested, in
+    'stats' and the SearchBudget, if any limit was given, in 'budget'"""
+    
+    def __init__(self, solutions, steps=(), stats=None, budget=None):
+        list.__init__(self, solutions)
+        self.steps=steps
+        self.stats=stats
+        self.budget=budget
+
+class Outcome(str):
+    """Result of Sudoku.solve_sudoku that is not a list of solutions:
+    'Unsolvable' or 'Budget exceeded'. It is equal to the plain string and
+    carries the recorded explanation, if any, in 'steps', the SolverStats, if
+    requested, in 'stats' and the SearchBudget, if any limit was given, in
+    'budget'"""
+    
+    def __new__(cls, value, steps=(), stats=None, budget=None):
+        outcome=str.__new__(cls, value)
+        outcome.steps=steps
+        outcome.stats=stats
+        outcome.budget=budget
+        return outcome
+
 class Sudoku:
-    """Sudoku class with solver and printer"""
+    """Sudoku class with solver and printer. The size of the sudoku (9x9,
+    16x16, 25x25...) is deduced from the number of cells of the string"""
     
     def __init__(self,sudoku_string, indentation=''):
         self.indentation=indentation
+        self.PRINT_SUDOKUS=False
+        self.RECORD_STEPS=False
+        self.explain=False # True if the explanation is being printed or recorded
+        self.advanced=False # True if update_marks also tries fish, wings and coloring
+        self.steps=[]
+        self.stats=None # SolverStats of the solve_sudoku call in progress, if requested
+        self.depth=0 # nested suppositions of the back tracking
+        self.budget=None # SearchBudget of the solve_sudoku call in progress, if any
         self.sudoku_string_original=sudoku_string
         self.sudoku_grid_original=string_to_grid(sudoku_string)
         self.sudoku_grid=string_to_grid(sudoku_string)
-        self.marks=np.ones((9,9,9),dtype=bool)
-        self.rows=np.zeros((9,9),dtype=bool)
-        self.columns=np.zeros((9,9),dtype=bool)
-        self.boxes=np.zeros((9,9),dtype=bool)
-      
-        for i in range(9):
-          for j in range(9):
+        self.topology=topology(round(len(self.sudoku_grid) ** 0.5))
+        n=self.topology.size
+        self.size=n
+        self.candidates=[self.topology.all_marks]*(n*n) # candidate mask of each cell (flat index n*i+j)
+        self.rows=[0]*n # mask of the numbers already placed in each row
+        self.columns=[0]*n # mask of the numbers already placed in each column
+        self.boxes=[0]*n # mask of the numbers already placed in each box
+        self.queue_all()
+        
+        givens=[]
+        for i in range(n):
+          for j in range(n):
             num=self.sudoku_grid[i][j]
             if num != '0':
-              num=int(num)-1
-              #box marks
-              for position in positions_box(getBox([i,j])):
-                self.marks[position[0]][position[1]][num]=False
-              #row marks
-              for position in positions_row(getRow([i,j])):
-                self.marks[position[0]][position[1]][num]=False
-              #column marks
-              for position in positions_column(getColumn([i,j])):
-                self.marks[position[0]][position[1]][num]=False
-              #other numbers marks
-              for other_number in range(9):
-                self.marks[i][j][other_number]=False
-              self.marks[i][j][num]=True
-              self.rows[i][num]=True
-              self.columns[j][num]=True
-              self.boxes[getBox([i,j])][num]=True
+              if not 1 <= int(num) <= n:
+                raise ValueError('Number ' + num + ' out of range in a ' + str(n) + 'x' + str(n) + ' sudoku')
+              givens.append((i, j, int(num)-1))
+        self.place_givens(givens)
+    
+    def place_givens(self, givens):
+        """Places the (i, j, num) givens of a new sudoku. Every unit and cell is
+        already queued, so, unless a number is repeated in a unit, the masks can
+        be computed directly instead of placing the numbers one by one"""
+        box_of_cell=self.topology.box_of_cell
+        n=self.size
+        repeated=False
+        for i, j, num in givens:
+          bit=1 << num
+          box=box_of_cell[n*i + j]
+          if (self.rows[i] | self.columns[j] | self.boxes[box]) & bit:
+            repeated=True
+          self.rows[i] |= bit
+          self.columns[j] |= bit
+          self.boxes[box] |= bit
+        if repeated:
+          self.rows[:]=[0]*n
+          self.columns[:]=[0]*n
+          self.boxes[:]=[0]*n
+          for i, j, num in givens:
+            self.place_number(i, j, num)
+          return
+        all_marks=self.topology.all_marks
+        rows, columns, boxes = self.rows, self.columns, self.boxes
+        self.candidates=[all_marks & ~(rows[index//n] | columns[index%n] | boxes[box_of_cell[index]])
+                         for index in range(n*n)]
+        for i, j, num in givens:
+          self.candidates[n*i + j]=1 << num
+    
+    def empty_cells(self, cells):
+        """Empties the cells (flat indices) of a sudoku that only has its
+        givens placed, without repeated numbers and before any rule is applied,
+        leaving it as if it had been built without them. Every unit and cell
+        is queued again"""
+        n=self.size
+        box_of_cell=self.topology.box_of_cell
+        for index in cells:
+          i, j = index//n, index%n
+          if self.sudoku_grid[i][j] != '0':
+            bit=1 << (int(self.sudoku_grid[i][j]) - 1)
+            self.rows[i] &= ~bit
+            self.columns[j] &= ~bit
+            self.boxes[box_of_cell[index]] &= ~bit
+            self.sudoku_grid[i][j]='0'
+        all_marks=self.topology.all_marks
+        rows, columns, boxes = self.rows, self.columns, self.boxes
+        for index in range(n*n):
+          if self.sudoku_grid[index//n][index%n] == '0':
+            self.candidates[index]=all_marks & ~(rows[index//n] | columns[index%n] | boxes[box_of_cell[index]])
+        self.queue_all()
+    
+    @property
+    def marks(self):
+        """Boolean (n,n,n) array built from the candidate masks: marks[i][j][num]
+        is True if number num+1 is still possible in cell (i,j). It is a copy,
+        changes to it do not affect the sudoku"""
+        import numpy as np # only needed here, not imported with the solver
+        n=self.size
+        masks=np.array(self.candidates, dtype=np.int64).reshape(n, n, 1)
+        return (masks >> np.arange(n)) & 1 == 1
+    
+    def queue_all(self):
+        """Marks every unit and cell to be checked by put_immediate_number"""
+        self.dirty_boxes=set(self.topology.all_number_unit_pairs)
+        self.dirty_rows=set(self.topology.all_number_unit_pairs)
+        self.dirty_columns=set(self.topology.all_number_unit_pairs)
+        self.dirty_cells=set(range(self.size*self.size))
+        self.pending_boxes=set()
+        self.pending_rows=set()
+        self.pending_columns=set()
+        self.pending_cells=set()
+    
+    def queue_state(self):
+        """The sets of queued and pending entries of put_immediate_number"""
+        return (self.dirty_boxes, self.dirty_rows, self.dirty_columns, self.dirty_cells,
+                self.pending_boxes, self.pending_rows, self.pending_columns, self.pending_cells)
+    
+    def queue_changes(self, index, removed):
+        """Queues cell 'index' and, for every number in the mask 'removed' (the
+        marks just removed from that cell), its row, column and box to be
+        checked again by put_immediate_number"""
+        row, column, box = index//self.size, index%self.size, self.topology.box_of_cell[index]
+        for num in self.topology.numbers_in_mask[removed]:
+          self.dirty_boxes.add((num, box))
+          self.dirty_rows.add((num, row))
+          self.dirty_columns.add((num, column))
+        self.dirty_cells.add(index)
+    
+    def remove_mark(self, i, j, num):
+        """Removes mark num+1 from cell (i,j)"""
+        self.candidates[self.size*i + j] &= ~(1 << num)
+        self.queue_changes(self.size*i + j, 1 << num)
+    
+    def place_number(self, i, j, num):
+        """Writes number num+1 in cell (i,j), removes its mark from every cell
+        in the same row, column and box and leaves it as the only mark of the cell"""
+        bit=1 << num
+        candidates=self.candidates
+        index=self.size*i + j
+        for peer in self.topology.peers[index]:
+          if candidates[peer] & bit:
+            candidates[peer] &= ~bit
+            self.queue_changes(peer, bit)
+        if candidates[index] != bit:
+          self.queue_changes(index, candidates[index] & ~bit)
+        candidates[index]=bit
+        self.rows[i] |= bit
+        self.columns[j] |= bit
+        self.boxes[self.topology.box_of_cell[index]] |= bit
+        self.sudoku_grid[i][j]=str(num+1)
         
-    def printer(self, message, printSudoku=True, i=-1, j=-1):
+    def record(self, step):
+        """Records an explanation step (see render_step) if RECORD_STEPS is set
+        and prints it if PRINT_SUDOKUS is set. It is only called when one of
+        them is set, i.e. when self.explain is True"""
+        if self.RECORD_STEPS:
+          self.steps.append(step)
         if self.PRINT_SUDOKUS:
-            print(self.indentation+message)
-            if printSudoku:
-                black='\033[90m'
-                blue='\033[94m'
-                magenta='\033[95m'
-                for row in range(9):
-                  print(self.indentation, end='')  
-                  if row % 3==0:
-                    print(black + '-------------------------'+ black)
-                    print(self.indentation, end='')
-                  for column in range(9):
-                    if column % 3==0:
-                      print( black +'|'+ black, end=' ')
-                    if self.sudoku_grid_original[row][column] != '0':
-                      print(black + self.sudoku_grid[row][column] + black, end=' ')
-                    elif i==row and j==column:
-                      print(magenta + self.sudoku_grid[row][column] + magenta, end=' ')
-                    elif self.sudoku_grid[row][column] == '0':
-                      print(' ', end=' ')
-                    else:
-                      print(blue + self.sudoku_grid[row][column] + blue, end=' ')
-                  print(black +'|'+ black)
-                print(self.indentation, end='')
-                print(black + '-------------------------'+ black)
+          print(self.indentation+render_step(step))
+          if step['rule'] in GRID_STEPS:
+            i, j = step.get('cell', (-1, -1))
+            print(render_grid(self.sudoku_grid, self.sudoku_grid_original, i, j, self.indentation), end='')
         
     def is_complete(self):
         """Check if the sudoku grid is complete"""
@@ -191,17 +969,83 @@ class Sudoku:
   
     def unsolvable(self):
         """Check if the sudoku grid is complete"""
-        for i in range(9):
-          for j in range(9):
-            if len([num for num in range(9) if self.marks[i][j][num]])==0:
-              return True
-        return False
+        return 0 in self.candidates
     
-    def solve_sudoku(self, PRINT_SUDOKUS=True):
-        """Sudoku solver"""
+    def solve_sudoku(self, PRINT_SUDOKUS=True, engine='rules', record_steps=False, stats=False,
+                     max_nodes=None, max_time=None, max_memory=None, advanced=None):
+        """Sudoku solver. With engine='rules' the sudoku is solved applying
+        logical rules, explaining each step. With engine='dlx' the exact cover
+        solver is used instead: it is faster but there is no explanation.
+        The explanation is printed if PRINT_SUDOKUS is True and, if
+        record_steps is True, kept as a list of steps in the 'steps' attribute
+        of the result (see render_steps). Otherwise it is not built at all.
+        If stats is True, the 'stats' attribute of the result is a SolverStats
+        with the counters of the rules and the back tracking.
+        max_nodes, max_time (seconds) and max_memory (bytes) limit the back
+        tracking of the rules engine or the search of the exact cover solver
+        (see SearchBudget): when one is reached
+        the search stops, the sudoku is left as it was and the result is
+        Outcome('Budget exceeded'). The 'budget' attribute of the result is
+        the SearchBudget with the counts, or None if no limit is given.
+        advanced selects the fish, wing and coloring tests of update_marks. By
+        default they are only tried when the steps are explained: a silent
+        solve gets the same solutions sooner from the back tracking"""
+        if engine not in ('rules', 'dlx'):
+          raise ValueError("engine must be 'rules' or 'dlx', not " + repr(engine))
+        if engine == 'dlx' and self.size != 9:
+          raise ValueError("engine='dlx' only solves 9x9 sudokus")
         self.PRINT_SUDOKUS=PRINT_SUDOKUS
+        self.RECORD_STEPS=record_steps
+        self.explain=PRINT_SUDOKUS or record_steps
+        self.advanced=self.explain if advanced is None else advanced
+        self.steps=[]
+        self.stats=SolverStats() if stats else None
+        if max_nodes is None and max_time is None and max_memory is None:
+          self.budget=None
+        else:
+          self.budget=SearchBudget(max_nodes, max_time, max_memory)
         start = time.time()
-        self.printer('Original Sudoku', True)
+        if self.explain:
+          self.record({'rule': 'original'})
+        if engine == 'dlx':
+          try:
+            solutions=solve_dlx(grid_to_string(self.sudoku_grid_original), budget=self.budget)
+          except BudgetExceeded:
+            solutions='Budget exceeded'
+          if solutions not in ('Unsolvable', 'Budget exceeded') and len(solutions)==1:
+            self.sudoku_grid=string_to_grid(solutions[0])
+            if self.explain:
+              self.record({'rule': 'solution', 'solution': solutions[0]})
+        elif self.budget is None:
+          solutions=self.solve_current_state()
+        else:
+          initial_state=(self.candidates[:], self.rows[:], self.columns[:], self.boxes[:],
+                         [row[:] for row in self.sudoku_grid], tuple(set(q) for q in self.queue_state()))
+          try:
+            solutions=self.solve_current_state()
+          except BudgetExceeded:
+            self.restore_state(initial_state)
+            self.depth=0
+            self.explain=PRINT_SUDOKUS or record_steps
+            solutions='Budget exceeded'
+        if solutions == 'Budget exceeded' and self.explain:
+          self.record({'rule': 'budget_exceeded', 'limit': self.budget.exceeded, 'nodes': self.budget.nodes})
+        end = time.time()
+        stats, self.stats = self.stats, None
+        budget, self.budget = self.budget, None
+        if stats is not None:
+          stats.total_seconds=end - start
+        if budget is not None:
+          budget.seconds=time.perf_counter() - budget.start
+        if solutions in ('Unsolvable', 'Budget exceeded'):
+          return Outcome(solutions, self.steps, stats, budget)
+        if self.explain:
+          self.record({'rule': 'solved', 'seconds': end - start})
+        return Solutions(solutions, self.steps, stats, budget)
+    
+    def solve_current_state(self):
+        """Applies the rules and the back tracking to the current state until
+        the grid is complete. Returns 'Unsolvable' or the list of solutions"""
         while True:
           if self.unsolvable():
             return 'Unsolvable'
@@ -214,373 +1058,490 @@ class Sudoku:
              continue
           else:
             solutions=self.back_tracking()
-            if len(solutions)==1:
-              break
-            elif len(solutions)==0:
+            if len(solutions)==0:
               continue
             else:
-                end = time.time()
-                self.printer('The sudoku has been solved in '+str(end - start)+' seconds!', False)
-                return solutions
-        end = time.time()
-        self.printer('The sudoku has been solved in '+str(end - start)+' seconds!', False)
+              return solutions
+        if self.budget is not None:
+          self.budget.solutions += 1
         return [grid_to_string(self.sudoku_grid)]
     
+    def save_state(self):
+        """Snapshot of the marks, the placed numbers, the grid and the queue of
+        put_immediate_number. Except for the queue, which is usually empty when
+        branching, it has a fixed size, so saving it at each level of the back
+        tracking costs the same at any depth. The queue is copied: the sets of
+        the sudoku are emptied by put_immediate_number"""
+        if self.stats is not None:
+          self.stats.snapshots += 1
+        return (self.candidates[:], self.rows[:], self.columns[:], self.boxes[:],
+                [row[:] for row in self.sudoku_grid], tuple(set(q) for q in self.queue_state()))
+    
+    def restore_state(self, state):
+        """Goes back to a snapshot taken with save_state"""
+        candidates, rows, columns, boxes, sudoku_grid, queue = state
+        self.candidates[:]=candidates
+        self.rows[:]=rows
+        self.columns[:]=columns
+        self.boxes[:]=boxes
+        self.sudoku_grid=[row[:] for row in sudoku_grid]
+        (self.dirty_boxes, self.dirty_rows, self.dirty_columns, self.dirty_cells,
+         self.pending_boxes, self.pending_rows, self.pending_columns, self.pending_cells) = [set(q) for q in queue]
+    
     def put_immediate_number(self):
         """Checks if it is possible to complete a number in the sudoku grid if
         any of immediate rules apply. If it is possible, the number is written,
         the marks are updated and True is immediately returned after the first
-        successful rule is fulfilled. Otherwise False is returned"""
+        successful rule is fulfilled. Otherwise False is returned.
+        Only the units and cells whose marks have changed since the last call
+        are checked again (see queue_changes); when several numbers can be
+        completed, the rules are applied in the same order as a full scan"""
         
         #RULE 1: Check if a number has only one place available in a certain box:
-        for num in range(9):
-            for box in range(9):
-              if not self.boxes[box][num]:
-                position=only_one_place_availabe_for_num_in_cells(positions_box(box), num, self.marks)
-                if position != -1: # Complete a cell
-                  #box marks
-                  for pos in positions_box(getBox(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #row marks
-                  for pos in positions_row(getRow(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #column marks
-                  for pos in positions_column(getColumn(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #that cell
-                  for other_number in range(9):
-                    self.marks[position[0]][position[1]][other_number]=False
-                  self.marks[position[0]][position[1]][num]=True
-                  self.rows[position[0]][num]=True
-                  self.columns[position[1]][num]=True
-                  self.boxes[box][num]=True
-                  self.sudoku_grid[position[0]][position[1]]=str(num+1)
-                  self.printer('There is only a cell where it is possible to put number '+str(num+1)+' in box '+ str(box+1),
-                                 True, position[0], position[1])
-                  return True
+        single=self.apply_rule('box_single', self.next_single, self.dirty_boxes, self.pending_boxes, self.boxes, self.topology.box_cells)
+        if single is not None: # Complete a cell
+          num, box, position = single
+          self.place_number(position[0], position[1], num)
+          if self.explain:
+            self.record({'rule': 'single', 'unit': 'box', 'index': box, 'number': num, 'cell': position})
+          return True
               
         #RULE 2: Check if a number has only one place available in the row:
-        for num in range(9):
-            for row in range(9):
-              if not self.rows[row][num]:
-                position=only_one_place_availabe_for_num_in_cells(positions_row(row), num, self.marks)
-                if position != -1:
-                  #box marks
-                  for pos in positions_box(getBox(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #row marks
-                  for pos in positions_row(getRow(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #column marks
-                  for pos in positions_column(getColumn(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #that cell
-                  for other_number in range(9):
-                    self.marks[position[0]][position[1]][other_number]=False
-                  self.marks[position[0]][position[1]][num]=True
-                  self.rows[position[0]][num]=True
-                  self.columns[position[1]][num]=True
-                  self.boxes[getBox(position)][num]=True
-                  self.sudoku_grid[position[0]][position[1]]=str(num+1)
-                  self.printer('There is only a cell where it is possible to put number '+str(num+1)+' in row '+ str(row+1),
-                                 True, position[0], position[1])
-                  return True
+        single=self.apply_rule('row_single', self.next_single, self.dirty_rows, self.pending_rows, self.rows, self.topology.row_cells)
+        if single is not None:
+          num, row, position = single
+          self.place_number(position[0], position[1], num)
+          if self.explain:
+            self.record({'rule': 'single', 'unit': 'row', 'index': row, 'number': num, 'cell': position})
+          return True
         #RULE 3: Check if a number has only one place available in the column:
-        for num in range(9):
-            for column in range(9):
-              if not self.columns[column][num]:
-                position=only_one_place_availabe_for_num_in_cells(positions_column(column), num, self.marks)
-                if position != -1:
-                  #box marks
-                  for pos in positions_box(getBox(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #row marks
-                  for pos in positions_row(getRow(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #column marks
-                  for pos in positions_column(getColumn(position)):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #that cell
-                  for other_number in range(9):
-                    self.marks[position[0]][position[1]][other_number]=False
-                  self.marks[position[0]][position[1]][num]=True
-                  self.rows[position[0]][num]=True
-                  self.columns[position[1]][num]=True
-                  self.boxes[getBox(position)][num]=True
-                  self.sudoku_grid[position[0]][position[1]]=str(num+1)
-                  self.printer('There is only a cell where it is possible to put number '+str(num+1)+' in column '+ str(column+1),
-                                 True, position[0], position[1])
-                  return True
+        single=self.apply_rule('column_single', self.next_single, self.dirty_columns, self.pending_columns, self.columns, self.topology.column_cells)
+        if single is not None:
+          num, column, position = single
+          self.place_number(position[0], position[1], num)
+          if self.explain:
+            self.record({'rule': 'single', 'unit': 'column', 'index': column, 'number': num, 'cell': position})
+          return True
         #RULE 4: Check if a cell has only one available number:
-        for i in range(9):
-            for j in range(9):
-              if self.sudoku_grid[i][j]=='0':
-                num=only_one_num_availabe_in_cell(i,j, self.marks)
-                if num != -1:
-                  #box marks
-                  for pos in positions_box(getBox([i,j])):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #row marks
-                  for pos in positions_row(getRow([i,j])):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #column marks
-                  for pos in positions_column(getColumn([i,j])):
-                    self.marks[pos[0]][pos[1]][num]=False
-                  #that cell
-                  for other_number in range(9):
-                    self.marks[i][j][other_number]=False
-                  self.marks[i][j][num]=True
-                  self.rows[i][num]=True
-                  self.columns[j][num]=True
-                  self.boxes[getBox([i,j])][num]=True
-                  self.sudoku_grid[i][j]=str(num+1)
-                  self.printer('The only possible correct number in cell ('+str(i+1)+','+str(j+1)+') is '+ str(num+1),
-                               True,i, j)
-                  return True
+        single=self.apply_rule('cell_single', self.next_cell_single)
+        if single is not None:
+          i, j, num = single
+          self.place_number(i, j, num)
+          if self.explain:
+            self.record({'rule': 'single', 'unit': 'cell', 'number': num, 'cell': (i, j)})
+          return True
         return False
     
+    def apply_rule(self, rule, test, *args):
+        """Calls test(*args), the test of 'rule', counting it in the stats if
+        they are enabled. A result other than None or False means that the
+        rule fired"""
+        if self.stats is None:
+          return test(*args)
+        start=time.perf_counter()
+        result=test(*args)
+        self.stats.count(rule, result is not None and result is not False, time.perf_counter() - start)
+        return result
+    
+    def next_single(self, dirty, pending, placed, unit_cells):
+        """Rules 1 to 3 for one kind of unit (boxes, rows or columns). Checks
+        the (number, unit) pairs in 'dirty' and keeps in 'pending' the ones where
+        the number has only one place available. Returns the first valid pending
+        (number, unit, position) in the order of a full scan, or None"""
+        candidates=self.candidates
+        for num, unit in dirty:
+          if not placed[unit] >> num & 1:
+            if only_one_cell_available_for_num(unit_cells[unit], 1 << num, candidates) != -1:
+              pending.add((num, unit))
+        dirty.clear()
+        while pending:
+          num, unit = min(pending)
+          pending.discard((num, unit))
+          if not placed[unit] >> num & 1:
+            cell=only_one_cell_available_for_num(unit_cells[unit], 1 << num, candidates)
+            if cell != -1:
+              return num, unit, (cell//self.size, cell%self.size)
+        return None
+    
+    def next_cell_single(self):
+        """Rule 4. Checks the cells in dirty_cells and keeps in pending_cells
+        the ones with only one mark. Returns the first empty pending cell in
+        reading order as (i, j, num), or None"""
+        popcount=self.topology.popcount
+        for index in self.dirty_cells:
+          if popcount[self.candidates[index]]==1:
+            self.pending_cells.add(index)
+        self.dirty_cells.clear()
+        while self.pending_cells:
+          index=min(self.pending_cells)
+          self.pending_cells.discard(index)
+          i, j = index//self.size, index%self.size
+          if self.sudoku_grid[i][j]=='0':
+            num=only_one_num_availabe_in_cell(i,j, self.candidates, self.topology)
+            if num != -1:
+              return i, j, num
+        return None
+    
     def update_marks(self):        
         """Check if any marks can be removed with a series of logical tests. 
         Returns True if a mark has been removed or False otherwise """
         
         # FIRST APPROACH: POINTING ROWS AND COLUMNS
-        
-        pointing_rows = np.zeros((9,9),dtype=set) # for each box and number, contains a list with the rows with at least one mark
-        pointing_columns = np.zeros((9,9),dtype=set) # for each box and number, contains a list with the columns with at least one mark
-        for box in range(9):
-          for num in range(9):
-            pointing_rows[box][num]=set({})
-            pointing_columns[box][num]=set({})
-            if not self.boxes[box][num]:
-              for pos in positions_box(box):
-                if self.marks[pos[0]][pos[1]][num]:
-                  pointing_rows[box][num].add(pos[0])
-                  pointing_columns[box][num].add(pos[1])
-        for box in range(9):
-          for num in range(9):
-            # 2 ROWS
-            if len(pointing_rows[box][num])==2:
-              # Check if another box in the same row of boxes has the exact same two
-              # pointing rows AND the other box has a pointing row belonging to those
-              # two same pointing rows
-              boxes=other_two_boxes_same_row(box)
-              # 2 ROWS OPTION A
-              if pointing_rows[boxes[0]][num]==pointing_rows[box][num] and len(pointing_rows[boxes[1]][num].intersection(pointing_rows[box][num]))>0:
-                removed_marks=[]
-                for pos in positions_box(boxes[1]):
-                  if pos[0] in pointing_rows[box][num] and self.marks[pos[0]][pos[1]][num]:
-                    self.marks[pos[0]][pos[1]][num]=False
-                    removed_marks.append(pos)
-                self.printer("Boxes " + str(box+1) + " and " + str(boxes[0]+1) +
-                      " share pointing marked rows " +  str([i+1 for i in pointing_rows[box][num]]) +
-                      " for number " + str(num+1) + " so all the marks for number " +
-                      str(num+1) + " in row(s) " +
-                      str([i+1 for i in pointing_rows[boxes[1]][num].intersection(pointing_rows[box][num])])+
-                      " of box " + str(boxes[1] + 1) +
-                      " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in removed_marks]), False)
-                return True
-               # 2 ROWS OPTION B
-              if pointing_rows[boxes[1]][num]==pointing_rows[box][num] and len(pointing_rows[boxes[0]][num].intersection(pointing_rows[box][num]))>0:
-                removed_marks=[]
-                for pos in positions_box(boxes[0]):
-                  if pos[0] in pointing_rows[box][num] and self.marks[pos[0]][pos[1]][num]:
-                    self.marks[pos[0]][pos[1]][num]=False
-                    removed_marks.append(pos)
-                self.printer("Boxes " + str(box+1) + " and " + str(boxes[1]+1) +
-                      " share pointing marked rows " + str([i+1 for i in pointing_rows[box][num]])
-                      + " for number " + str(num+1) + " so all the marks for number "
-                      + str(num+1) + " in row(s) " +
-                      str([i+1 for i in pointing_rows[boxes[0]][num].intersection(pointing_rows[box][num])])+
-                      " of box " + str(boxes[0]+1) +
-                      " shall be removed, i.e."+ str([[pos[0]+1,pos[1]+1] for pos in removed_marks]),False)
-                return True
-            # 1 ROW
-            if len(pointing_rows[box][num])==1:
-              # Check if another box in the same row of boxes has a pointing mark
-              # of the same number in the same row
-              boxes=other_two_boxes_same_row(box)
-      
-              if len(pointing_rows[boxes[1]][num].intersection(pointing_rows[box][num])) > 0 or len(pointing_rows[boxes[0]][num].intersection(pointing_rows[box][num])) > 0:
-                removed_marks=[]
-                for b in boxes:
-                  for pos in positions_box(b):
-                    if pos[0] in pointing_rows[box][num] and self.marks[pos[0]][pos[1]][num]:
-                      self.marks[pos[0]][pos[1]][num]=False
-                      removed_marks.append(pos)
-                self.printer("Box " + str(box+1) + " has only a pointing marked row " +
-                      str([i +1 for i in pointing_rows[box][num]]) + " for number " +
-                      str(num+1) + " so all the marks for number " + str(num+1) + " in row " +
-                      str([i +1 for i in pointing_rows[box][num]]) +
-                      " of boxes " + str([b+1 for b in boxes]) +
-                      " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in removed_marks]),False)
-                return True
-            # 2 COLUMNS
-            if len(pointing_columns[box][num])==2:
-              # Check if another box in the same column of boxes has the exact same two
-              # pointing columns AND the other box has a pointing column belonging to those
-              # two same pointing columns
-              boxes=other_two_boxes_same_column(box)
-              # 2 COLUMN OPTION A
-              if pointing_columns[boxes[0]][num]==pointing_columns[box][num] and len(pointing_columns[boxes[1]][num].intersection(pointing_columns[box][num]))>0:
-                removed_marks=[]
-                for pos in positions_box(boxes[1]):
-                  if pos[1] in pointing_columns[box][num] and self.marks[pos[0]][pos[1]][num]:
-                    self.marks[pos[0]][pos[1]][num]=False
-                    removed_marks.append(pos)
-                self.printer("Boxes " + str(box+1) + " and " + str(boxes[0]+1) +
-                      " share pointing marked columns " +  str([i+1 for i in pointing_columns[box][num]]) +
-                      " for number " + str(num+1) + " so all the marks for number " +
-                      str(num+1) + " in column(s) " +
-                      str([i+1 for i in pointing_columns[boxes[1]][num].intersection(pointing_columns[box][num])])+
-                      " of box " + str(boxes[1] + 1) +
-                      " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in removed_marks]),False)
-                return True
-               # 2 COLUMN OPTION B
-              if pointing_columns[boxes[1]][num]==pointing_columns[box][num] and len(pointing_columns[boxes[0]][num].intersection(pointing_columns[box][num]))>0:
-                removed_marks=[]
-                for pos in positions_box(boxes[0]):
-                  if pos[1] in pointing_columns[box][num] and self.marks[pos[0]][pos[1]][num]:
-                    self.marks[pos[0]][pos[1]][num]=False
-                    removed_marks.append(pos)
-                self.printer("Boxes " + str(box+1) + " and " + str(boxes[1]+1) +
-                      " share pointing marked columns " + str([i+1 for i in pointing_columns[box][num]])
-                      + " for number " + str(num+1) + " so all the marks for number "
-                      + str(num+1) + " in column(s) " +
-                      str([i+1 for i in pointing_columns[boxes[0]][num].intersection(pointing_columns[box][num])])+
-                      " of box " + str(boxes[0]+1) +
-                      " shall be removed, i.e."+ str([[pos[0]+1,pos[1]+1] for pos in removed_marks]),False)
-                return True
-            # 1 COLUMN
-            if len(pointing_columns[box][num])==1:
-              # Check if another box in the same column of boxes has a pointing mark
-              # of the same number in the same column
-              boxes=other_two_boxes_same_column(box)
-      
-              if len(pointing_columns[boxes[1]][num].intersection(pointing_columns[box][num])) > 0 or len(pointing_columns[boxes[0]][num].intersection(pointing_columns[box][num])) > 0:
-                removed_marks=[]
-                for b in boxes:
-                  for pos in positions_box(b):
-                    if pos[1] in pointing_columns[box][num] and self.marks[pos[0]][pos[1]][num]:
-                      self.marks[pos[0]][pos[1]][num]=False
-                      removed_marks.append(pos)
-                self.printer("Box " + str(box+1) + " has only a pointing marked column " +
-                      str([i +1 for i in pointing_columns[box][num]]) + " for number " +
-                      str(num+1) + " so all the marks for number " + str(num+1) + " in column " +
-                      str([i +1 for i in pointing_columns[box][num]]) +
-                      " of boxes " + str([b+1 for b in boxes]) +
-                      " shall be removed, i.e." + str([[pos[0]+1,pos[1]+1] for pos in removed_marks]),False)
-                return True
-      
+        if self.apply_rule('pointing', self.pointing_marks):
+          return True
         # SECOND APPROACH: OBVIOUS SETS
-        
-        #Obvious sets in box
-        for box in range(9):
-            cells=[pos for pos in positions_box(box) if self.sudoku_grid[pos[0]][pos[1]]=='0']
-            for n in range(len(cells)-2):
-              dev = obvious_set(n, cells, self.marks)
-              if dev != None:
-                self.printer("Box " + str(box+1) + " has a set of "+ str(len(dev['subset']))+ " cells " + str([[pos[0]+1,pos[1]+1] for pos in dev['subset']]) +
-                      " where the only marks are " +  str([i+1 for i in dev['numbers_in_subset']]) +
-                      " so no marks of those numbers are possible in the other cells of the box, i.e., the following marks should be removed " +
-                      str([([pos[0]+1,pos[1]+1],num+1) for (pos,num) in dev['removed_marks']]), False)
-                return True
-        # Obvious sets in row
-        for row in range(9):
-            cells=[pos for pos in positions_row(row) if self.sudoku_grid[pos[0]][pos[1]]=='0']
-            for n in range(len(cells)-2):
-              dev = obvious_set(n, cells, self.marks)
+        if self.apply_rule('obvious_set', self.obvious_sets):
+          return True
+        # THIRD APPROACH: HIDDEN SETS
+        if self.apply_rule('hidden_set', self.hidden_sets):
+          return True
+        # The advanced approaches are only tried when asked for (see
+        # solve_sudoku) and never inside a supposition, where they rarely fire
+        # and the back tracking is cheaper than testing them at every node
+        if not self.advanced or self.depth > 0:
+          return False
+        # The places of each number, which the advanced tests share as long as
+        # none of them fires
+        places=places_in_units(self.candidates, self.topology)
+        # FOURTH APPROACH: FISH (X-WING, SWORDFISH, JELLYFISH)
+        if self.apply_rule('fish', self.fishes, places):
+          return True
+        # FIFTH APPROACH: XY-WINGS AND XYZ-WINGS
+        if self.apply_rule('xy_wing', self.wings, xy_wing, 'xy_wing'):
+          return True
+        if self.apply_rule('xyz_wing', self.wings, xyz_wing, 'xyz_wing'):
+          return True
+        # SIXTH APPROACH: SIMPLE COLORING
+        return self.apply_rule('simple_coloring', self.simple_colorings, places)
+    
+    def pointing_marks(self):
+        """Pointing rows and columns test over every box and number. Returns
+        True if marks have been removed"""
+        n=self.size
+        t=self.topology
+        pointing_rows = [[set() for num in range(n)] for box in range(n)] # for each box and number, contains a list with the rows with at least one mark
+        pointing_columns = [[set() for num in range(n)] for box in range(n)] # for each box and number, contains a list with the columns with at least one mark
+        candidates=self.candidates
+        for box in range(n):
+          if t.box_size == 3:
+            row_masks=[(row, candidates[a] | candidates[b] | candidates[c]) for row, (a, b, c) in BOX_ROW_SEGMENTS[box]]
+            column_masks=[(column, candidates[a] | candidates[b] | candidates[c]) for column, (a, b, c) in BOX_COLUMN_SEGMENTS[box]]
+          else:
+            row_masks=[(row, union_of(candidates, cells)) for row, cells in t.box_row_segments[box]]
+            column_masks=[(column, union_of(candidates, cells)) for column, cells in t.box_column_segments[box]]
+          for num in range(n):
+            if not self.boxes[box] >> num & 1:
+              bit=1 << num
+              for row, mask in row_masks:
+                if mask & bit:
+                  pointing_rows[box][num].add(row)
+              for column, mask in column_masks:
+                if mask & bit:
+                  pointing_columns[box][num].add(column)
+        for box in range(n):
+          for num in range(n):
+            # ROWS (only one or two pointing lines can remove marks)
+            if 0 < len(pointing_rows[box][num]) < 3 and self.pointing_lines(pointing_rows, t.other_boxes_same_row[box], box, num, 0):
+              return True
+            # COLUMNS
+            if 0 < len(pointing_columns[box][num]) < 3 and self.pointing_lines(pointing_columns, t.other_boxes_same_column[box], box, num, 1):
+              return True
+        return False
+    
+    def obvious_sets(self):
+        """Obvious sets test over every box, row and column. Returns True if
+        marks have been removed"""
+        t=self.topology
+        max_set=t.max_obvious_set if self.depth == 0 else t.max_obvious_set_in_search
+        for unit, positions_unit in (('box', t.box_positions), ('row', t.row_positions), ('column', t.column_positions)):
+          for index in range(self.size):
+            cells=[pos for pos in positions_unit[index] if self.sudoku_grid[pos[0]][pos[1]]=='0']
+            for n in range(1, min(len(cells)-2, max_set+1)):
+              dev = obvious_set(n, cells, self.candidates, t)
               if dev != None:
-                self.printer("Row " + str(row+1) + " has a set of "+ str(len(dev['subset']))+ " cells " + str([[pos[0]+1,pos[1]+1] for pos in dev['subset']]) +
-                      " where the only marks are " +  str([i+1 for i in dev['numbers_in_subset']]) +
-                      " so no marks of those numbers are possible in the other cells of the row, i.e., the following marks should be removed " +
-                      str([([pos[0]+1,pos[1]+1],num+1) for (pos,num) in dev['removed_marks']]), False)
+                for (pos,num) in dev['removed_marks']:
+                  self.queue_changes(self.size*pos[0] + pos[1], 1 << num)
+                if self.explain:
+                  self.record({'rule': 'obvious_set', 'unit': unit, 'index': index, 'cells': list(dev['subset']),
+                               'numbers': list(dev['numbers_in_subset']), 'removed': dev['removed_marks']})
                 return True
-        # Obvious sets in column
-        for column in range(9):
-            cells=[pos for pos in positions_column(column) if self.sudoku_grid[pos[0]][pos[1]]=='0']
-            for n in range(len(cells)-2):
-              dev = obvious_set(n, cells, self.marks)
+        return False
+    
+    def hidden_sets(self):
+        """Hidden pairs test over every box, row and column. Returns True if
+        marks have been removed. A hidden set of n numbers in k empty cells is
+        the complement of an obvious set of k-n cells, so only the hidden pairs
+        are not found by obvious_sets"""
+        t=self.topology
+        max_set=t.max_hidden_set if self.depth == 0 else t.max_hidden_set_in_search
+        for unit, positions_unit in (('box', t.box_positions), ('row', t.row_positions), ('column', t.column_positions)):
+          for index in range(self.size):
+            cells=[pos for pos in positions_unit[index] if self.sudoku_grid[pos[0]][pos[1]]=='0']
+            for n in range(2, min(len(cells)-2, max_set)+1):
+              dev = hidden_set(n, cells, self.candidates, t)
               if dev != None:
-                self.printer("Column " + str(column+1) + " has a set of "+ str(len(dev['subset']))+ " cells " + str([[pos[0]+1,pos[1]+1] for pos in dev['subset']]) +
-                      " where the only marks are " +  str([i+1 for i in dev['numbers_in_subset']]) +
-                      " so no marks of those numbers are possible in the other cells of the column, i.e., the following marks should be removed " +
-                      str([([pos[0]+1,pos[1]+1],num+1) for (pos,num) in dev['removed_marks']]),False)
+                for (pos,num) in dev['removed_marks']:
+                  self.queue_changes(self.size*pos[0] + pos[1], 1 << num)
+                if self.explain:
+                  self.record({'rule': 'hidden_set', 'unit': unit, 'index': index, 'cells': list(dev['subset']),
+                               'numbers': list(dev['numbers_in_subset']), 'removed': dev['removed_marks']})
                 return True
         return False
     
+    def fishes(self, places):
+        """Fish test (see fish) for every number and orientation, given the
+        places of the numbers (see places_in_units). Returns True if marks
+        have been removed"""
+        for num in range(self.size):
+          for line, placed in ((0, self.rows), (1, self.columns)):
+            dev = fish(num, line, places[line+1][num], self.candidates, placed, self.topology)
+            if dev != None:
+              for pos in dev['removed']:
+                self.queue_changes(self.size*pos[0] + pos[1], 1 << num)
+              if self.explain:
+                self.record({'rule': 'fish', 'size': dev['size'], 'number': num, 'line': LINE_NAMES[line],
+                             'lines': dev['lines'], 'cover_lines': dev['cover_lines'], 'removed': dev['removed']})
+              return True
+        return False
+    
+    def wings(self, test, rule):
+        """XY-Wing or XYZ-Wing test (the function 'test', see xy_wing and
+        xyz_wing), recorded as 'rule'. Returns True if marks have been removed"""
+        dev = test(self.candidates, self.topology)
+        if dev == None:
+          return False
+        for pos in dev['removed']:
+          self.queue_changes(self.size*pos[0] + pos[1], 1 << dev['number'])
+        if self.explain:
+          self.record({'rule': rule, 'pivot': dev['pivot'], 'wings': dev['wings'], 'number': dev['number'],
+                       'removed': dev['removed']})
+        return True
+    
+    def simple_colorings(self, places):
+        """Simple coloring test (see simple_coloring) for every number, given
+        the places of the numbers (see places_in_units). Returns True if marks
+        have been removed"""
+        for num in range(self.size):
+          dev = simple_coloring(num, [unit_places[num] for unit_places in places], self.candidates,
+                                self.boxes, self.rows, self.columns, self.topology)
+          if dev != None:
+            for pos in dev['removed']:
+              self.queue_changes(self.size*pos[0] + pos[1], 1 << num)
+            if self.explain:
+              self.record({'rule': 'simple_coloring', 'number': num, 'colors': dev['colors'],
+                           'false_color': dev['false_color'], 'removed': dev['removed']})
+            return True
+        return False
+    
+    def pointing_lines(self, pointing, boxes, box, num, line):
+        """Pointing rows (line=0) or columns (line=1) test for number num+1 in
+        'box', given the other boxes of its band or stack and the pointing
+        lines of every box and number. Returns True if marks have been removed"""
+        lines=pointing[box][num]
+        # 2 LINES
+        if len(lines)==2:
+          if self.stats is not None:
+            self.stats.evaluated['pointing_pair'] += 1
+          # Check if another box in the same row (column) of boxes has the exact same two
+          # pointing lines AND the other box has a pointing line belonging to those
+          # two same pointing lines
+          for same, other in [(same, other) for same in boxes for other in boxes if other != same]:
+            if pointing[same][num]==lines and len(pointing[other][num].intersection(lines))>0:
+              removed_marks=self.remove_marks_in_lines([other], lines, num, line)
+              if self.stats is not None:
+                self.stats.fired['pointing_pair'] += 1
+              if self.explain:
+                self.record({'rule': 'pointing_pair', 'line': LINE_NAMES[line], 'box': box, 'other_box': same,
+                             'lines': list(lines), 'number': num, 'target_lines': list(pointing[other][num].intersection(lines)),
+                             'target_box': other, 'removed': removed_marks})
+              return True
+        # 1 LINE
+        if len(lines)==1:
+          if self.stats is not None:
+            self.stats.evaluated['pointing_line'] += 1
+          # Check if another box in the same row (column) of boxes has a pointing mark
+          # of the same number in the same line
+          if any(len(pointing[other][num].intersection(lines)) > 0 for other in boxes):
+            removed_marks=self.remove_marks_in_lines(boxes, lines, num, line)
+            if self.stats is not None:
+              self.stats.fired['pointing_line'] += 1
+            if self.explain:
+              self.record({'rule': 'pointing_line', 'line': LINE_NAMES[line], 'box': box, 'lines': list(lines),
+                           'number': num, 'target_boxes': list(boxes), 'removed': removed_marks})
+            return True
+        return False
+    
+    def remove_marks_in_lines(self, boxes, lines, num, line):
+        """Removes the marks of number num+1 in the given rows (line=0) or
+        columns (line=1) of the given boxes. Returns the positions changed"""
+        removed_marks=[]
+        bit=1 << num
+        for b in boxes:
+          for pos in self.topology.box_positions[b]:
+            if pos[line] in lines and self.candidates[self.size*pos[0] + pos[1]] & bit:
+              self.remove_mark(pos[0], pos[1], num)
+              removed_marks.append(pos)
+        return removed_marks
+    
+    def branching_cell(self):
+        """First cell (in reading order) with the lowest number of marks among
+        the ones with more than one mark. Returns its flat index or -1"""
+        best=-1
+        popcount=self.topology.popcount
+        for index, mask in enumerate(self.candidates):
+          if popcount[mask] >= 2 and (best == -1 or popcount[mask] < popcount[self.candidates[best]]):
+            best=index
+            if popcount[mask] == 2:
+              break
+        return best
+    
+    def count_solutions(self, limit=2):
+        """Number of solutions of the sudoku, counting at most up to 'limit':
+        the search stops as soon as 'limit' solutions have been found. Nothing
+        is printed and the sudoku is left as it was"""
+        explain=self.explain
+        self.explain=False
+        state=self.save_state()
+        count=self.count_current_state(limit)
+        self.restore_state(state)
+        self.explain=explain
+        return count
+    
+    def has_unique_solution(self):
+        """Check if the sudoku is well-posed, i.e. it has exactly one solution"""
+        return self.count_solutions(2) == 1
+    
+    def put_immediate_numbers(self):
+        """Applies the immediate rules until none applies. Returns False if
+        the sudoku turns out to be unsolvable"""
+        while True:
+          if self.unsolvable():
+            return False
+          if not self.put_immediate_number():
+            return True
+    
+    def count_current_state(self, limit):
+        """Counts the solutions from the current state, working in place. Only
+        the immediate rules are applied before branching: when just the number
+        of solutions is needed, trying the values of a cell is cheaper than the
+        pointing and obvious set tests"""
+        if not self.put_immediate_numbers():
+          return 0
+        best=self.branching_cell()
+        if best == -1:
+          return 1
+        i, j = best//self.size, best%self.size
+        count=0
+        state=self.save_state()
+        for num in self.topology.numbers_in_mask[self.candidates[best]]:
+          self.place_number(i, j, num)
+          count += self.count_current_state(limit - count)
+          self.restore_state(state)
+          if count >= limit:
+            break
+        return count
+    
     def back_tracking(self):
         """Expands a tree search trying all the alternatives in a cell with
         multiple marks. First, tries the cells with the lowest number
-        of marks. """
-        for posible_marks in range(2,9):
-          for i in range(9):
-            for j in range(9):
-              possible_marks_in_cell=[num for num in range(9) if self.marks[i][j][num]]
-              if len(possible_marks_in_cell)==posible_marks:
-                self.printer('The possible values for cell ('+str(i+1)+', '+str(j+1)+') are: '+str([i+1 for i in possible_marks_in_cell]),False)
-                possible_solutions=[]
-                for num in possible_marks_in_cell:                 
-                  sudoku_grid_branch=copy.deepcopy(self.sudoku_grid)
-                  sudoku_grid_branch[i][j]=str(num+1)
-                  self.printer('  * Let\'s suppose that the correct number in cell ('+str(i+1)+','+str(j+1)+') is '+str(num+1),False)
-                  sudoku_branch=Sudoku(grid_to_string(sudoku_grid_branch), self.indentation + '     ')                  
-                  solutions=sudoku_branch.solve_sudoku(False)
-                  if solutions == 'Unsolvable':
-                    self.printer('  It leads to the sudoku being unsolvable, so mark '+
-                          str(num+1)+' is removed from cell ('+str(i+1)+','+str(j+1)+')',False)
-                    self.marks[i][j][num]=False
-                    return []
-                  else:
-                    possible_solutions = possible_solutions + solutions
-                    self.printer('  This supposition leads to a complete grid', False)
-                if len(possible_solutions)>1:
-                  self.printer('There are more than one possible solution so the sudoku is ill-posed: ' + str(possible_solutions),False)
-                  return possible_solutions
-                if len(possible_solutions)==1:
-                  return possible_solutions
+        of marks. Each alternative is explored in place, on this same sudoku,
+        and the state is restored afterwards. """
+        if self.stats is not None:
+          # Time of the suppositions, not counted as back tracking time
+          start, nested = time.perf_counter(), 0.0
+        best=self.branching_cell()
+        if best == -1:
+          if self.budget is not None:
+            self.budget.solutions += 1
+          if self.stats is not None:
+            self.stats.backtracking_seconds += time.perf_counter() - start
+          return [grid_to_string(self.sudoku_grid)]
+        i, j = best//self.size, best%self.size
+        possible_marks_in_cell=self.topology.numbers_in_mask[self.candidates[best]]
+        if self.explain:
+          self.record({'rule': 'branch', 'cell': (i, j), 'numbers': list(possible_marks_in_cell)})
+        possible_solutions=[]
+        state=self.save_state()
+        explain=self.explain
+        for num in possible_marks_in_cell:
+          if explain:
+            self.record({'rule': 'suppose', 'cell': (i, j), 'number': num})
+          self.place_number(i, j, num)
+          self.explain=False
+          self.depth += 1
+          if self.stats is not None:
+            self.stats.branches += 1
+            self.stats.max_depth=max(self.stats.max_depth, self.depth)
+          if self.budget is not None:
+            if not self.budget.state_bytes:
+              self.budget.state_bytes=state_bytes(state)
+              # A solution string and its reference in the list of solutions
+              self.budget.solution_bytes=sys.getsizeof(grid_to_string(self.sudoku_grid)) + 8
+            self.budget.check_node(self.depth)
+          if self.stats is not None:
+            nested_start=time.perf_counter()
+          solutions=self.solve_current_state()
+          if self.stats is not None:
+            nested += time.perf_counter() - nested_start
+          self.depth -= 1
+          self.explain=explain
+          self.restore_state(state)
+          if solutions == 'Unsolvable':
+            self.remove_mark(i, j, num)
+            if explain:
+              self.record({'rule': 'contradiction', 'cell': (i, j), 'number': num})
+            if possible_solutions and not explain:
+              # The solutions of the previous numbers are kept: without this
+              # mark they are still the solutions of the sudoku, and finding
+              # them again would explore their subtrees once more. When the
+              # steps are explained (only at the top level) the sudoku is
+              # solved on from here instead, so that the rest is explained
+              state=self.save_state()
+              continue
+            if self.budget is not None:
+              # The solutions of the previous numbers are dropped and found again
+              self.budget.solutions -= len(possible_solutions)
+            if self.stats is not None:
+              self.stats.backtracking_seconds += time.perf_counter() - start - nested
+            return []
+          else:
+            possible_solutions = possible_solutions + solutions
+            if explain:
+              self.record({'rule': 'supposition_solved'})
+        if len(possible_solutions)>1 and explain:
+          self.record({'rule': 'ill_posed', 'solutions': possible_solutions})
+        if self.stats is not None:
+          self.stats.backtracking_seconds += time.perf_counter() - start - nested
+        return possible_solutions
         
 
 
 """TESTS"""
 
-# easy = Sudoku('004300209005009001070060043006002087190007400050083000600000105003508690042910300')
-# difficult1 = Sudoku('045020000000001005000080300210000080070000010000000693001906000600000000900300008')
-# difficult2 = Sudoku('093470060080000000000600001800000030034009005100040000000005200067090010400000000')
-# difficult3 = Sudoku('040800005090000030308007002030000000000060007105900020000009500004000000802500010')
-# difficult4 = Sudoku('600130008800000275000728000000069007003080090000400016096000000150604000080000009')
-# difficult5 = Sudoku('200300010500000000008205000000000235480000100090000800067040000000008070000010003')
-# difficult6 = Sudoku('600108250510000984800040010400001032281090745700402090926010070058060020000000560')
-# difficult7 = Sudoku('000000010000002003000400000000000500401600000007100000050000200000080040030910000')
-difficult8 = Sudoku('000701000200050009050080070100003060002000590030500002080070020900030007000406000')
-# sudoku_ill_posed = Sudoku('413678009682935741759421638394016800175892463826040910937164080561280304248050106')
-# sudoku_ill_posed = Sudoku('295743861431865900876192543387459216612387495549216738763524189928671354154938600')
-
-# solution = easy.solve_sudoku()
-# solution = difficult1.solve_sudoku()
-# solution = difficult2.solve_sudoku()
-# solution = difficult3.solve_sudoku()
-# solution = difficult4.solve_sudoku()
-# solution = difficult5.solve_sudoku()
-# solution = difficult6.solve_sudoku()
-# solution = difficult7.solve_sudoku()
-solution = difficult8.solve_sudoku()
-# solution = sudoku_ill_posed.solve_sudoku()
-
-
-# df1 = pd.read_csv('sudoku.csv', delimiter=',', nrows = None)
-# df1.dataframeName = 'sudoku.csv'
-# nRow, nCol = df1.shape
-# print(f'There are {nRow} rows and {nCol} columns')
-
-
-# for i in range(nRow):
-#     if i % 10000==0:
-#         print(i)
-#     solution=Sudoku(df1.iloc[i]['quizzes']).solve_sudoku(False)
-#     if solution!=df1.iloc[i]['solutions']:
-#       print(solution)
-#       print(df1.iloc[i]['solutions'])
-#       print(str(i)+' ERROR!!!')
-#       break
-  
-        
\ No newline at end of file
+if __name__ == '__main__':
+    # easy = Sudoku('004300209005009001070060043006002087190007400050083000600000105003508690042910300')
+    # difficult1 = Sudoku('045020000000001005000080300210000080070000010000000693001906000600000000900300008')
+    # difficult2 = Sudoku('093470060080000000000600001800000030034009005100040000000005200067090010400000000')
+    # difficult3 = Sudoku('040800005090000030308007002030000000000060007105900020000009500004000000802500010')
+    # difficult4 = Sudoku('600130008800000275000728000000069007003080090000400016096000000150604000080000009')
+    # difficult5 = Sudoku('200300010500000000008205000000000235480000100090000800067040000000008070000010003')
+    # difficult6 = Sudoku('600108250510000984800040010400001032281090745700402090926010070058060020000000560')
+    # difficult7 = Sudoku('000000010000002003000400000000000500401600000007100000050000200000080040030910000')
+    difficult8 = Sudoku('000701000200050009050080070100003060002000590030500002080070020900030007000406000')
+    # sudoku_ill_posed = Sudoku('413678009682935741759421638394016800175892463826040910937164080561280304248050106')
+    # sudoku_ill_posed = Sudoku('295743861431865900876192543387459216612387495549216738763524189928671354154938600')
+
+    # solution = easy.solve_sudoku()
+    # solution = difficult1.solve_sudoku()
+    # solution = difficult2.solve_sudoku()
+    # solution = difficult3.solve_sudoku()
+    # solution = difficult4.solve_sudoku()
+    # solution = difficult5.solve_sudoku()
+    # solution = difficult6.solve_sudoku()
+    # solution = difficult7.solve_sudoku()
+    solution = difficult8.solve_sudoku()
+    # solution = sudoku_ill_posed.solve_sudoku()
+
+
+    # To check a whole file of quizzes and solutions, like sudoku.csv, use the
+    # bulk solver: python bulk_solve.py sudoku.csv -o results.csv
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Batch solver: applies the immediate rules (only one number available in a
+cell and only one place available for a number in a row, column or box) to
+thousands of sudokus at once with NumPy array operations. Only the sudokus
+that are not completed by those rules are solved one by one with the Sudoku
+class.
+"""
+
+import numpy as np
+
+from Sudoku import Sudoku, Solutions
+
+
+def puzzles_to_array(puzzles):
+  """Parse a list of 81-character strings into an (N,9,9) array of numbers,
+  0 (or . in the string) being an empty cell. Whitespace around a string,
+  like the end of a line read from a file, is ignored as in sudoku_cells"""
+  puzzles=[puzzle.strip() for puzzle in puzzles]
+  for puzzle in puzzles:
+    if len(puzzle) != 81:
+      raise ValueError('A sudoku string must have 81 characters: ' + repr(puzzle))
+  data=np.frombuffer(''.join(puzzles).replace('.', '0').encode('ascii'), dtype=np.uint8) - ord('0')
+  if (data > 9).any():
+    raise ValueError('A sudoku string must only have the digits 0-9 (or .)')
+  return data.reshape(-1, 9, 9)
+
+
+def array_to_puzzles(grids):
+  """Parse an (N,9,9) array of numbers into a list of 81-character strings"""
+  data=(grids.reshape(-1, 81) + ord('0')).astype(np.uint8)
+  return [row.tobytes().decode('ascii') for row in data]
+
+
+def initial_candidates(grids):
+  """Returns the (N,9,9,9) candidate tensor and the (N,9,9,9) tensor of
+  placed numbers of a set of grids: candidates[p,i,j,num] is True if number
+  num+1 has not been discarded for cell (i,j) of sudoku p and placed[p,i,j,num]
+  is True if number num+1 is written in that cell"""
+  placed=np.zeros(grids.shape + (9,), dtype=bool)
+  p, i, j = np.nonzero(grids)
+  placed[p, i, j, grids[p, i, j] - 1]=True
+  candidates=~placed.any(axis=3, keepdims=True) | placed
+  return candidates, placed
+
+
+def box_view(tensor):
+  """(N,9,9,9) tensor seen as (N,3,3,3,3,9): box row, row in box, box column,
+  column in box, number"""
+  return tensor.reshape(-1, 3, 3, 3, 3, 9)
+
+
+def expand_boxes(box_tensor):
+  """Broadcast an (N,3,3,9) per-box tensor to every cell, giving (N,9,9,9)"""
+  return np.repeat(np.repeat(box_tensor, 3, axis=1), 3, axis=2)
+
+
+def propagation_step(candidates, placed):
+  """Removes the marks of the placed numbers from the rest of their rows,
+  columns and boxes and places every naked single (only one number available
+  in a cell) and hidden single (only one place available for a number in a
+  row, column or box). Works in place and returns two boolean arrays of N
+  elements: the sudokus where at least one number has been placed and the
+  sudokus that have been found to be contradictory"""
+  in_row=placed.any(axis=2)
+  in_column=placed.any(axis=1)
+  in_box=box_view(placed).any(axis=(2, 4))
+  candidates &= ~(in_row[:, :, None, :] | in_column[:, None, :, :] | expand_boxes(in_box))
+  candidates |= placed
+
+  empty=~placed.any(axis=3)
+  free=candidates & empty[..., None]
+  counts=candidates.sum(axis=3)
+  new=free & (counts == 1)[..., None]
+  new |= free & (free.sum(axis=2) == 1)[:, :, None, :]
+  new |= free & (free.sum(axis=1) == 1)[:, None, :, :]
+  new |= free & expand_boxes(box_view(free).sum(axis=(2, 4)) == 1)
+  placed |= new
+
+  contradictory=(counts == 0).any(axis=(1, 2))
+  contradictory |= (new.sum(axis=3) > 1).any(axis=(1, 2))
+  contradictory |= (placed.sum(axis=2) > 1).any(axis=(1, 2))
+  contradictory |= (placed.sum(axis=1) > 1).any(axis=(1, 2))
+  contradictory |= (box_view(placed).sum(axis=(2, 4)) > 1).any(axis=(1, 2, 3))
+  return new.any(axis=(1, 2, 3)), contradictory
+
+
+def propagate(grids):
+  """Applies propagation_step to a set of grids until none of them changes.
+  Returns the resulting (N,9,9) grids and a boolean array with the sudokus
+  that have been found to be contradictory"""
+  candidates, placed = initial_candidates(grids)
+  contradictory=np.zeros(len(grids), dtype=bool)
+  active=np.arange(len(grids))
+  while active.size > 0:
+    active_candidates=candidates[active]
+    active_placed=placed[active]
+    progress, dead = propagation_step(active_candidates, active_placed)
+    candidates[active]=active_candidates
+    placed[active]=active_placed
+    contradictory[active[dead]]=True
+    complete=active_placed.any(axis=3).all(axis=(1, 2))
+    active=active[progress & ~dead & ~complete]
+  return np.where(placed.any(axis=3), placed.argmax(axis=3) + 1, 0), contradictory
+
+
+def solve_batch(puzzles, chunk_size=50000):
+  """Solves a list of sudoku strings. Returns, for each of them, the same
+  result as Sudoku(puzzle).solve_sudoku(False): Solutions or
+  Outcome('Unsolvable'). The sudokus are propagated together in chunks of
+  'chunk_size' (each chunk needs about 1.5 KB per sudoku) and the ones that
+  are left incomplete are solved with the Sudoku class"""
+  puzzles=list(puzzles)
+  solutions=[]
+  for start in range(0, len(puzzles), chunk_size):
+    chunk=puzzles[start:start + chunk_size]
+    grids, contradictory = propagate(puzzles_to_array(chunk))
+    for puzzle, grid, dead in zip(chunk, array_to_puzzles(grids), contradictory):
+      if dead:
+        solutions.append(Sudoku(puzzle).solve_sudoku(False))
+      elif '0' not in grid:
+        solutions.append(Solutions([grid]))
+      else:
+        solutions.append(Sudoku(grid).solve_sudoku(False))
+  return solutions
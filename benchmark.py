@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the rules solver. It runs the test sudokus of Sudoku.py and
+corpora of generated sudokus bucketed by difficulty (the last phase of the
+solver they need: immediate rules, marks or back tracking) and reports, for
+each corpus, the latencies (mean, p50, p95, p99), the counters and time
+of each rule (see SolverStats), the time of the back tracking itself and
+of the rest of the solver, the nodes of the search tree and the peak
+memory allocated while solving. The results are saved as JSON, so the ones of two
+commits can be compared.
+
+It also measures the time to import the solver in a new process, which every
+worker of a pool pays when it starts, and fails if it is over a budget or if
+the import loads NumPy, pandas or termcolor.
+
+The generated corpora are saved to a file the first time and loaded from it
+afterwards, so that every commit is measured on the same sudokus.
+
+Usage:
+  python benchmark.py -o before.json
+  python benchmark.py -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import py_compile
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Sudoku import Sudoku, SolverStats, sudoku_cells
+from generator import random_grid, remove_clues
+
+TEST_PUZZLES={
+  'easy': '004300209005009001070060043006002087190007400050083000600000105003508690042910300',
+  'difficult1': '045020000000001005000080300210000080070000010000000693001906000600000000900300008',
+  'difficult2': '093470060080000000000600001800000030034009005100040000000005200067090010400000000',
+  'difficult3': '040800005090000030308007002030000000000060007105900020000009500004000000802500010',
+  'difficult4': '600130008800000275000728000000069007003080090000400016096000000150604000080000009',
+  'difficult5': '200300010500000000008205000000000235480000100090000800067040000000008070000010003',
+  'difficult6': '600108250510000984800040010400001032281090745700402090926010070058060020000000560',
+  'difficult7': '000000010000002003000400000000000500401600000007100000050000200000080040030910000',
+  'difficult8': '000701000200050009050080070100003060002000590030500002080070020900030007000406000',
+  'ill_posed1': '413678009682935741759421638394016800175892463826040910937164080561280304248050106',
+  'ill_posed2': '295743861431865900876192543387459216612387495549216738763524189928671354154938600',
+}
+
+BUCKETS=('singles', 'marks', 'backtracking')
+
+# Modules that the solver must not load when it is imported (see import_time)
+HEAVY_MODULES=('numpy', 'pandas', 'termcolor')
+
+def solve_with_stats(sudoku_string):
+  """SolverStats of solving a sudoku"""
+  return Sudoku(sudoku_string).solve_sudoku(False, stats=True).stats
+
+
+def difficulty(sudoku_string):
+  """Bucket of a sudoku: the last phase of the solver it needs"""
+  stats=solve_with_stats(sudoku_string)
+  if stats.branches > 0:
+    return 'backtracking'
+  if stats.evaluated['pointing'] > 0:
+    return 'marks'
+  return 'singles'
+
+
+def random_puzzle(rng, clues):
+  """Removes numbers of a random grid, in random order, while the sudoku
+  keeps a unique solution, until 'clues' numbers are left or none can be
+  removed"""
+  return ''.join(remove_clues(sudoku_cells(random_grid(rng)), rng, clues))
+
+
+def generate_corpora(per_bucket, seed, max_attempts):
+  """Corpora of 'per_bucket' generated sudokus for each difficulty bucket.
+  A bucket may be left shorter if it is not filled in 'max_attempts' sudokus"""
+  rng=random.Random(seed)
+  corpora={bucket: [] for bucket in BUCKETS}
+  for _ in range(max_attempts):
+    if all(len(corpus) >= per_bucket for corpus in corpora.values()):
+      break
+    puzzle=random_puzzle(rng, rng.randint(20, 36))
+    bucket=difficulty(puzzle)
+    if len(corpora[bucket]) < per_bucket:
+      corpora[bucket].append(puzzle)
+  return corpora
+
+
+def load_corpora(path, per_bucket, seed, max_attempts, regenerate=False):
+  """Generated corpora saved in 'path', generating them if the file does not
+  exist (or 'regenerate' is set)"""
+  if os.path.exists(path) and not regenerate:
+    with open(path) as f:
+      return json.load(f)
+  corpora=generate_corpora(per_bucket, seed, max_attempts)
+  with open(path, 'w') as f:
+    json.dump(corpora, f, indent=1)
+  return corpora
+
+
+def percentile(values, q):
+  """Nearest-rank percentile 'q' (0-100) of a non-empty list"""
+  values=sorted(values)
+  return values[min(len(values) - 1, max(0, int(round(q/100*len(values))) - 1))]
+
+
+def latencies(puzzles, repeat):
+  """Best of 'repeat' solving times of each sudoku, in seconds"""
+  times=[]
+  for puzzle in puzzles:
+    best=float('inf')
+    for _ in range(repeat):
+      start=time.perf_counter()
+      Sudoku(puzzle).solve_sudoku(False)
+      best=min(best, time.perf_counter() - start)
+    times.append(best)
+  return times
+
+
+def peak_memory(puzzle):
+  """Peak memory allocated while building and solving a sudoku, in bytes"""
+  tracemalloc.start()
+  try:
+    tracemalloc.reset_peak()
+    base=tracemalloc.get_traced_memory()[0]
+    Sudoku(puzzle).solve_sudoku(False)
+    return tracemalloc.get_traced_memory()[1] - base
+  finally:
+    tracemalloc.stop()
+
+
+def run_corpus(puzzles, repeat, memory=True):
+  """Measures a list of sudokus. Returns a dictionary of results"""
+  times=latencies(puzzles, repeat)
+  rules={rule: {'seconds': 0.0, 'evaluated': 0, 'fired': 0} for rule in SolverStats.RULES}
+  backtracking=0.0
+  other=0.0
+  nodes=[]
+  depths=[]
+  for puzzle in puzzles:
+    stats=solve_with_stats(puzzle)
+    for rule in SolverStats.RULES:
+      rules[rule]['seconds'] += stats.seconds[rule]
+      rules[rule]['evaluated'] += stats.evaluated[rule]
+      rules[rule]['fired'] += stats.fired[rule]
+    backtracking += stats.backtracking_seconds
+    other += stats.total_seconds - sum(stats.seconds.values()) - stats.backtracking_seconds
+    nodes.append(stats.branches + 1)
+    depths.append(stats.max_depth)
+  result={
+    'puzzles': len(puzzles),
+    'total_seconds': sum(times),
+    'mean_ms': 1000*sum(times)/len(times),
+    'p50_ms': 1000*percentile(times, 50),
+    'p95_ms': 1000*percentile(times, 95),
+    'p99_ms': 1000*percentile(times, 99),
+    'max_ms': 1000*max(times),
+    'rules': rules,
+    'backtracking_seconds': backtracking,
+    'other_seconds': other,
+    'nodes': {'total': sum(nodes), 'mean': sum(nodes)/len(nodes), 'max': max(nodes), 'max_depth': max(depths)},
+  }
+  if memory:
+    peaks=[peak_memory(puzzle) for puzzle in puzzles]
+    result['memory_kb']={'p50': percentile(peaks, 50)/1024, 'max': max(peaks)/1024}
+  return result
+
+
+def import_time(module='Sudoku', repeat=5):
+  """Best time, in milliseconds, of importing 'module' in a new interpreter
+  (its bytecode is compiled first, the compilation is not measured) and the
+  list of the HEAVY_MODULES that the import loads"""
+  directory=os.path.dirname(os.path.abspath(__file__))
+  py_compile.compile(os.path.join(directory, module + '.py'))
+  code=('import json, sys, time\n'
+          't = time.perf_counter()\n'
+          'import ' + module + '\n'
+          'elapsed = 1000*(time.perf_counter() - t)\n'
+          'print(json.dumps([elapsed, [m for m in ' + repr(HEAVY_MODULES) + ' if m in sys.modules]]))')
+  best, heavy = float('inf'), []
+  for _ in range(repeat):
+    output=subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=directory).stdout
+    elapsed, heavy = json.loads(output)
+    best=min(best, elapsed)
+  return best, heavy
+
+
+def git_commit():
+  """Commit of the working tree being measured, or None outside of git"""
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(old, new, threshold):
+  """Prints the change of the latencies of every corpus present in both
+  results. Returns the number of regressions (slower by more than
+  'threshold', a fraction)"""
+  regressions=0
+  print(f"Comparing {old.get('commit')} -> {new.get('commit')}")
+  for name, result in new['corpora'].items():
+    if name not in old['corpora']:
+      continue
+    for metric in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'):
+      before, after = old['corpora'][name][metric], result[metric]
+      change=(after - before)/before if before > 0 else 0.0
+      flag=''
+      if change > threshold:
+        flag='  REGRESSION'
+        regressions += 1
+      print(f'  {name:14} {metric:8} {before:10.3f} -> {after:10.3f} ({change:+.1%}){flag}')
+  return regressions
+
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description='Benchmark the rules solver')
+  parser.add_argument('-o', '--output', help='JSON file for the results (standard output by default)')
+  parser.add_argument('--corpora', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpora.json'),
+                      help='file of the generated corpora')
+  parser.add_argument('--regenerate', action='store_true', help='generate the corpora even if the file exists')
+  parser.add_argument('--per-bucket', type=int, default=30, help='generated sudokus per difficulty bucket')
+  parser.add_argument('--max-attempts', type=int, default=2000, help='maximum sudokus generated to fill the buckets')
+  parser.add_argument('--seed', type=int, default=0, help='seed of the generated corpora')
+  parser.add_argument('--repeat', type=int, default=3, help='times each sudoku is solved to take the best time')
+  parser.add_argument('--no-memory', action='store_true', help='do not measure the allocated memory')
+  parser.add_argument('--compare', help='previous JSON results to compare with')
+  parser.add_argument('--threshold', type=float, default=0.10, help='slowdown reported as a regression (0.10 is 10%%)')
+  parser.add_argument('--import-budget', type=float, default=20.0,
+                      help='maximum milliseconds to import the solver in a new worker process')
+  args=parser.parse_args(argv)
+
+  failures=0
+  import_ms, heavy = import_time()
+  print(f'import Sudoku   {import_ms:.2f} ms (budget {args.import_budget:.2f} ms)'
+        + (f', loads {", ".join(heavy)}' if heavy else ''), file=sys.stderr)
+  if import_ms > args.import_budget or heavy:
+    print('  IMPORT BUDGET EXCEEDED', file=sys.stderr)
+    failures += 1
+
+  corpora={'tests': list(TEST_PUZZLES.values())}
+  corpora.update(load_corpora(args.corpora, args.per_bucket, args.seed, args.max_attempts, args.regenerate))
+  results={
+    'commit': git_commit(),
+    'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'repeat': args.repeat,
+    'import': {'ms': import_ms, 'budget_ms': args.import_budget, 'heavy_modules': heavy},
+    'corpora': {},
+  }
+  for name, puzzles in corpora.items():
+    if puzzles:
+      results['corpora'][name]=run_corpus(puzzles, args.repeat, not args.no_memory)
+      result=results['corpora'][name]
+      print(f"{name:14} {result['puzzles']:5} sudokus  p50 {result['p50_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms"
+            f"  p99 {result['p99_ms']:8.3f} ms  nodes {result['nodes']['total']}", file=sys.stderr)
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=1)
+  else:
+    print(json.dumps(results, indent=1))
+  if args.compare:
+    with open(args.compare) as f:
+      failures += compare(json.load(f), results, args.threshold)
+  return 1 if failures else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary storage of 9x9 sudokus. Every cell takes 4 bits (0 is an
+empty cell), so a sudoku is a fixed record of 41 bytes instead of a line of
+82 characters, and a file of puzzles with their solutions takes 82 bytes per
+sudoku. The file is an 8-byte header followed by the records:
+
+  magic 'SUDK', version (1), flags (1 if the solutions are stored), 2 zeros
+  puzzle record (41 bytes) [solution record (41 bytes)]
+  ...
+
+The files are read through np.memmap: records are views of the file, nothing
+is loaded until it is used, and files larger than the memory can be iterated
+by chunks.
+
+  write_puzzles('sudoku.sdk', zip(quizzes, solutions))
+  with PuzzleFile('sudoku.sdk') as puzzles:
+    sudoku=sudoku_from_record(puzzles.puzzles[1234])
+    for quizzes, solutions in puzzles.iter_chunks(100000):
+      ...
+
+Usage:
+  python binary_format.py sudoku.csv sudoku.sdk
+  python binary_format.py sudoku.sdk sudoku.csv
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+from Sudoku import Sudoku
+
+MAGIC=b'SUDK'
+VERSION=1
+HEADER_SIZE=8
+RECORD_SIZE=41  # 81 cells of 4 bits, the last half byte is 0
+WITH_SOLUTIONS=1
+
+
+def pack(puzzles):
+  """(N, 41) uint8 array of records of a list of 81-character strings"""
+  for puzzle in puzzles:
+    if len(puzzle) != 81:
+      raise ValueError('A sudoku string must have 81 characters: ' + repr(puzzle))
+  digits=np.zeros((len(puzzles), 82), dtype=np.uint8)
+  if puzzles:
+    data=np.frombuffer(''.join(puzzles).replace('.', '0').encode('ascii'), dtype=np.uint8) - ord('0')
+    if (data > 9).any():
+      raise ValueError('A sudoku string must only have the digits 0-9 (or .)')
+    digits[:, :81]=data.reshape(-1, 81)
+  return (digits[:, 0::2] << 4) | digits[:, 1::2]
+
+
+def unpack(records):
+  """(N, 81) uint8 array of the numbers (0 for empty) of an (N, 41) array of
+  records"""
+  records=np.asarray(records, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+  digits=np.empty((len(records), 82), dtype=np.uint8)
+  digits[:, 0::2]=records >> 4
+  digits[:, 1::2]=records & 15
+  return digits[:, :81]
+
+
+def unpack_strings(records):
+  """List of the 81-character strings of an (N, 41) array of records"""
+  data=(unpack(records) + ord('0')).astype(np.uint8)
+  return [row.tobytes().decode('ascii') for row in data]
+
+
+def record_to_string(record):
+  """81-character string of a single 41-byte record"""
+  return unpack_strings(record)[0]
+
+
+def sudoku_from_record(record):
+  """Sudoku of a 41-byte record"""
+  return Sudoku(record_to_string(record))
+
+
+def is_packable(puzzle):
+  """Check if a sudoku string can be stored: 81 digits or dots"""
+  return isinstance(puzzle, str) and len(puzzle) == 81 and not puzzle.strip('0123456789.')
+
+
+def write_puzzles(path, puzzles, with_solutions=None, chunk_size=100000, invalid=None):
+  """Writes an iterable of sudoku strings, or of (puzzle, solution) pairs,
+  to a binary file, 'chunk_size' sudokus at a time, so that the input can be
+  larger than the memory. The kind of input is taken from its first element
+  unless 'with_solutions' is given. The items with a puzzle or a solution
+  that is not 81 digits or dots are skipped and appended to the list
+  'invalid' if it is given. The file is written under a temporary name and
+  only renamed to 'path' when it is complete, so an error never leaves a
+  truncated file behind. Returns the number of sudokus written"""
+  iterator=iter(puzzles)
+  first=next(iterator, None)
+  if with_solutions is None:
+    with_solutions=first is not None and not isinstance(first, str)
+  written=0
+  temporary=path + '.tmp'
+  try:
+    with open(temporary, 'wb') as f:
+      f.write(MAGIC + bytes([VERSION, WITH_SOLUTIONS if with_solutions else 0, 0, 0]))
+      chunk=[]
+      for item in itertools.chain([] if first is None else [first], iterator):
+        if not (all(is_packable(puzzle) for puzzle in item) if with_solutions else is_packable(item)):
+          if invalid is not None:
+            invalid.append(item)
+          continue
+        if len(chunk) == chunk_size:
+          written += _write_chunk(f, chunk, with_solutions)
+          chunk=[]
+        chunk.append(item)
+      if chunk:
+        written += _write_chunk(f, chunk, with_solutions)
+    os.replace(temporary, path)
+  except BaseException:
+    if os.path.exists(temporary):
+      os.remove(temporary)
+    raise
+  return written
+
+
+def _write_chunk(f, chunk, with_solutions):
+  if with_solutions:
+    quizzes, solutions = zip(*chunk)
+    records=np.hstack([pack(list(quizzes)), pack(list(solutions))])
+  else:
+    records=pack(chunk)
+  f.write(records.tobytes())
+  return len(chunk)
+
+
+class PuzzleFile:
+  """Binary file of sudokus mapped in memory. 'puzzles' (and 'solutions' if
+  they are stored, None otherwise) are (N, 41) arrays of records that are
+  views of the file"""
+
+  def __init__(self, path):
+    with open(path, 'rb') as f:
+      header=f.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+      raise ValueError(path + ' is not a binary sudoku file')
+    if header[4] != VERSION:
+      raise ValueError('Unsupported version ' + str(header[4]) + ' of binary sudoku file ' + path)
+    self.path=path
+    self.with_solutions=bool(header[5] & WITH_SOLUTIONS)
+    width=2*RECORD_SIZE if self.with_solutions else RECORD_SIZE
+    data=np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE)
+    if data.size % width:
+      raise ValueError(path + ' is truncated')
+    self._data=data.reshape(-1, width)
+    self.puzzles=self._data[:, :RECORD_SIZE]
+    self.solutions=self._data[:, RECORD_SIZE:] if self.with_solutions else None
+
+  def __len__(self):
+    return len(self._data)
+
+  def __getitem__(self, index):
+    """(puzzle, solution or None) strings of the sudoku 'index'"""
+    puzzle=record_to_string(self.puzzles[index])
+    return puzzle, record_to_string(self.solutions[index]) if self.with_solutions else None
+
+  def sudoku(self, index):
+    """Sudoku of the puzzle 'index'"""
+    return sudoku_from_record(self.puzzles[index])
+
+  def iter_chunks(self, chunk_size=100000, start=0, stop=None):
+    """Yields (puzzles, solutions or None) lists of strings of up to
+    'chunk_size' sudokus. Only the chunk being read is loaded in memory"""
+    stop=len(self) if stop is None else min(stop, len(self))
+    for begin in range(start, stop, chunk_size):
+      end=min(begin + chunk_size, stop)
+      puzzles=unpack_strings(self.puzzles[begin:end])
+      yield puzzles, unpack_strings(self.solutions[begin:end]) if self.with_solutions else None
+
+  def __iter__(self):
+    """Yields the (puzzle, solution or None) strings of every sudoku"""
+    for puzzles, solutions in self.iter_chunks():
+      yield from zip(puzzles, solutions or [None]*len(puzzles))
+
+  def close(self):
+    # The memmap is closed when no view of it is left
+    self._data=self.puzzles=self.solutions=None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+
+def is_binary_file(path):
+  """Check if a file starts with the magic of the binary format"""
+  with open(path, 'rb') as f:
+    return f.read(len(MAGIC)) == MAGIC
+
+
+def read_csv_rows(path):
+  """Yields (quiz, solution or None) of a CSV file with a 'quizzes' column,
+  like sudoku.csv, row by row. Empty rows are skipped. A row without a quiz
+  (too short, or with an empty quiz) is yielded as the whole line, which is
+  not a sudoku, so that the solvers report it as invalid instead of the
+  reading stopping with an IndexError"""
+  with open(path, newline='') as f:
+    reader=csv.reader(f)
+    header=next(reader)
+    quizzes=header.index('quizzes')
+    solutions=header.index('solutions') if 'solutions' in header else None
+    for row in reader:
+      if not any(cell.strip() for cell in row):
+        continue
+      quiz=row[quizzes].strip() if quizzes < len(row) else ''
+      solution=row[solutions].strip() if solutions is not None and solutions < len(row) else ''
+      yield quiz or ','.join(row), solution or None
+
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description='Convert a CSV file of sudokus to the binary format and back')
+  parser.add_argument('input', help="CSV file with a 'quizzes' column (and optionally 'solutions') or binary file")
+  parser.add_argument('output', help='binary file or CSV file (the opposite of the input)')
+  parser.add_argument('--max-report', type=int, default=20, help='maximum number of invalid rows listed')
+  args=parser.parse_args(argv)
+
+  start=time.time()
+  invalid=[]
+  if is_binary_file(args.input):
+    count=0
+    with PuzzleFile(args.input) as puzzles, open(args.output, 'w', newline='') as f:
+      writer=csv.writer(f)
+      writer.writerow(['quizzes', 'solutions'] if puzzles.with_solutions else ['quizzes'])
+      for quizzes, solutions in puzzles.iter_chunks():
+        writer.writerows(zip(quizzes, solutions) if solutions else ([quiz] for quiz in quizzes))
+        count += len(quizzes)
+  else:
+    with open(args.input, newline='') as f:
+      with_solutions='solutions' in next(csv.reader(f))
+    rows=read_csv_rows(args.input)
+    count=write_puzzles(args.output, rows if with_solutions else (quiz for quiz, _ in rows), with_solutions,
+                          invalid=invalid)
+    if invalid:
+      print(f'Skipped {len(invalid)} invalid rows:', file=sys.stderr)
+      for row in invalid[:args.max_report]:
+        print(f'  {row!r}', file=sys.stderr)
+  print(f'Converted {count} sudokus in {time.time() - start:.2f} seconds', file=sys.stderr)
+  return 1 if invalid else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk solver. solve_stream solves the sudoku strings of any iterable (a list,
+an open file, sys.stdin, a generator reading a socket...) and yields the
+results as they are ready, reading the input only a few chunks ahead of the
+output, so that the memory stays bounded whatever the size of the input:
+
+  with open('puzzles.txt') as f:
+    for puzzle, solutions, status in solve_stream(f, workers=8):
+      ...
+
+The command line reads sudokus from a CSV file with 'quizzes' (and
+optionally 'solutions') columns, like sudoku.csv, from a binary file (see
+binary_format.py), or from a plain text file or the standard input with one
+sudoku per line, and writes the results in the same order as the input.
+
+Usage:
+  python bulk_solve.py sudoku.csv -o results.csv --workers 8
+  python generator.py -n 1000 | cut -d, -f1 | python bulk_solve.py - --unordered
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from Sudoku import Sudoku
+from batch import solve_batch
+from binary_format import PuzzleFile, is_binary_file, read_csv_rows
+
+
+def status_of(result):
+  """'solved', 'unsolvable' or 'multiple' (ill-posed sudoku)"""
+  if result == 'Unsolvable':
+    return 'unsolvable'
+  if len(result) > 1:
+    return 'multiple'
+  return 'solved'
+
+
+def is_batch_quiz(quiz):
+  """Check if solve_batch can read a quiz: 81 digits or dots"""
+  return len(quiz) == 81 and not quiz.strip('0123456789.')
+
+
+def solve_one(quiz):
+  """(quiz, result, status) of a quiz that solve_batch cannot read: another
+  format or size, or a string that is not a sudoku, whose status is
+  'invalid' and whose result is the error message"""
+  try:
+    result=Sudoku(quiz).solve_sudoku(False)
+  except ValueError as error:
+    return quiz, str(error), 'invalid'
+  return quiz, result, status_of(result)
+
+
+def solve_chunk(quizzes):
+  """Worker task: (quiz, result of Sudoku(quiz).solve_sudoku(False), status)
+  for each quiz. The quizzes that are not 9x9 digit strings are solved one by
+  one, so that an invalid one only gets the status 'invalid'"""
+  batch=[quiz for quiz in quizzes if is_batch_quiz(quiz)]
+  solved=zip(batch, solve_batch(batch))
+  results=[]
+  for quiz in quizzes:
+    if is_batch_quiz(quiz):
+      quiz, result = next(solved)
+      results.append((quiz, result, status_of(result)))
+    else:
+      results.append(solve_one(quiz))
+  return results
+
+
+def chunks_of(puzzles, chunk_size):
+  """Yields lists of up to 'chunk_size' sudoku strings of an iterable (of
+  str, or of bytes like the lines of a socket or of a file opened in binary
+  mode), skipping blank lines and the spaces around each sudoku"""
+  decoded=(puzzle.decode('ascii', 'replace') if isinstance(puzzle, bytes) else puzzle for puzzle in puzzles)
+  stripped=(puzzle.strip() for puzzle in decoded)
+  nonblank=(puzzle for puzzle in stripped if puzzle)
+  while True:
+    chunk=list(itertools.islice(nonblank, chunk_size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def failed_chunk(chunk, error):
+  """(quiz, error message, 'error') for each quiz of a chunk that could not
+  be solved, for instance because its worker process died"""
+  message=type(error).__name__ + ': ' + str(error)
+  return [(quiz, message, 'error') for quiz in chunk]
+
+
+def chunk_results(future, chunk):
+  """Results of a chunk submitted to the pool, or failed_chunk"""
+  try:
+    return future.result()
+  except Exception as error:
+    return failed_chunk(chunk, error)
+
+
+def solve_stream(puzzles, workers=1, chunk_size=1000, ordered=True):
+  """Yields (puzzle, solutions, status) for every sudoku string of the
+  iterable 'puzzles', where solutions is the same as
+  Sudoku(puzzle).solve_sudoku(False) and status is 'solved', 'unsolvable',
+  'multiple' or 'invalid' (see solve_chunk). The sudokus are solved by chunks
+  of 'chunk_size', in this process or in a pool of 'workers' processes, with
+  at most 2*workers chunks in flight. With 'ordered' False the chunks are
+  yielded as soon as they are solved instead of in the input order.
+  A sudoku never ends the stream: if its chunk fails as a whole (a worker
+  process dies, for instance), every sudoku of the chunk gets the status
+  'error' and the error message instead of the solutions, and the pool is
+  started again for the next chunks"""
+  chunks=chunks_of(puzzles, chunk_size)
+  if workers <= 1:
+    for chunk in chunks:
+      try:
+        results=solve_chunk(chunk)
+      except Exception as error:
+        results=failed_chunk(chunk, error)
+      yield from results
+    return
+  executor=ProcessPoolExecutor(max_workers=workers)
+
+  def submit(chunk):
+    nonlocal executor
+    try:
+      return executor.submit(solve_chunk, chunk)
+    except BrokenProcessPool:
+      # A worker died: the chunks in flight fail, the next ones go to a new pool
+      executor.shutdown(wait=False)
+      executor=ProcessPoolExecutor(max_workers=workers)
+      return executor.submit(solve_chunk, chunk)
+
+  try:
+    pending=deque()
+    chunk_of={}  # future -> its chunk
+    for chunk in chunks:
+      future=submit(chunk)
+      pending.append(future)
+      chunk_of[future]=chunk
+      if len(pending) < 2*workers:
+        continue
+      if ordered:
+        future=pending.popleft()
+        yield from chunk_results(future, chunk_of.pop(future))
+      else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          pending.remove(future)
+          yield from chunk_results(future, chunk_of.pop(future))
+    if ordered:
+      while pending:
+        future=pending.popleft()
+        yield from chunk_results(future, chunk_of.pop(future))
+    else:
+      while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          pending.remove(future)
+          yield from chunk_results(future, chunk_of.pop(future))
+  finally:
+    executor.shutdown()
+
+
+def read_puzzles(path):
+  """Yields (quiz, expected solution or None) of a CSV, binary or
+  one-sudoku-per-line file ('-' for the standard input), one at a time"""
+  if path == '-':
+    for line in sys.stdin:
+      if line.strip():
+        yield line.strip(), None
+    return
+  if is_binary_file(path):
+    with PuzzleFile(path) as puzzles:
+      yield from puzzles
+    return
+  with open(path) as f:
+    header=f.readline().strip()
+  if 'quizzes' in header.split(','):
+    for quiz, solution in read_csv_rows(path):
+      yield quiz, solution or None
+  else:
+    with open(path) as f:
+      for line in f:
+        if line.strip():
+          yield line.strip(), None
+
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description='Solve a file of sudokus with several processes')
+  parser.add_argument('input', help="CSV file with a 'quizzes' column, binary file or file with one sudoku per line "
+                                    "('-' for the standard input)")
+  parser.add_argument('-o', '--output', help='output CSV file (standard output by default)')
+  parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+  parser.add_argument('--chunk-size', type=int, default=1000, help='sudokus sent to a worker at once')
+  parser.add_argument('--unordered', action='store_true', help='write the results as they are ready, not in the input order')
+  parser.add_argument('--progress', type=int, default=100000, help='report progress every this many sudokus (0 to disable)')
+  parser.add_argument('--max-report', type=int, default=20, help='maximum number of invalid sudokus and mismatches listed')
+  args=parser.parse_args(argv)
+
+  # The expected solutions of the sudokus in flight, in the input order. Out
+  # of order they cannot be matched with the results, so they are not checked
+  expected_solutions=deque()
+
+  def quizzes():
+    for quiz, expected in read_puzzles(args.input):
+      if not quiz.strip():  # skipped by solve_stream
+        continue
+      if not args.unordered:
+        expected_solutions.append(expected)
+      yield quiz
+
+  output=open(args.output, 'w', newline='') if args.output else sys.stdout
+  writer=csv.writer(output)
+  writer.writerow(['quizzes', 'solutions', 'status'])
+  start=time.time()
+  solved=0
+  mismatches=[]
+  invalid=[]
+  try:
+    for quiz, result, status in solve_stream(quizzes(), args.workers, args.chunk_size, not args.unordered):
+      writer.writerow([quiz, ';'.join(result) if status in ('solved', 'multiple') else '', status])
+      expected=None if args.unordered else expected_solutions.popleft()
+      if status in ('invalid', 'error'):
+        invalid.append((solved, quiz, status, result))
+      elif expected is not None and (status != 'solved' or result[0] != expected):
+        mismatches.append((solved, quiz, expected, result))
+      solved += 1
+      if args.progress and solved % args.progress == 0:
+        elapsed=time.time() - start
+        print(f'{solved} sudokus, {solved/elapsed:.1f} sudokus/sec', file=sys.stderr)
+  finally:
+    if args.output:
+      output.close()
+
+  elapsed=time.time() - start
+  print(f'Solved {solved} sudokus in {elapsed:.2f} seconds ({solved/max(elapsed, 1e-9):.1f} sudokus/sec)', file=sys.stderr)
+  if invalid:
+    print(f'{len(invalid)} invalid or failed sudokus:', file=sys.stderr)
+    for row, quiz, status, error in invalid[:args.max_report]:
+      print(f'  row {row}: {quiz!r} {status}: {error}', file=sys.stderr)
+  if mismatches:
+    print(f'{len(mismatches)} mismatches with the expected solutions:', file=sys.stderr)
+    for row, quiz, expected, result in mismatches[:args.max_report]:
+      print(f'  row {row}: {quiz} expected {expected} got {result}', file=sys.stderr)
+  return 1 if invalid or mismatches else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
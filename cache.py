@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of solutions keyed by the canonical form of the sudoku.
+
+Two sudokus that differ only by a relabeling of the numbers, a transposition,
+a permutation of the rows inside a band (or of the columns inside a stack) or
+a permutation of the bands (or stacks) have the same solutions, transformed
+in the same way. canonical_form chooses one representative of all those
+variants, so a sudoku is solved once and its variants are answered by
+transforming the cached solutions back.
+
+Only a sudoku seen before exactly is answered in microseconds, from a
+dictionary. A variant pays for the canonical search, which tries every row
+and column order that the invariant keys cannot tell apart: usually a few
+tenths of a millisecond, and some milliseconds for sudokus with many ties.
+That is still far less than solving a sudoku that needs back tracking.
+"""
+
+import itertools
+import json
+import os
+from collections import OrderedDict
+
+from Sudoku import Sudoku, Solutions, Outcome, sudoku_cells
+
+
+def tie_orders(items, key):
+  """All the orderings of 'items' sorted by 'key' in which only the items
+  with the same key are permuted among themselves"""
+  groups=[list(group) for _, group in itertools.groupby(sorted(items, key=key), key=key)]
+  return [sum(combination, ()) for combination in itertools.product(*[itertools.permutations(g) for g in groups])]
+
+
+def line_orders(grid, max_orders):
+  """Row orders of the grid (a list of 9 strings) to consider as canonical.
+  Bands and rows are sorted by keys that do not change under any of the
+  transformations, so the set of orders is the same for every variant of
+  the sudoku. Returns None if there are more than 'max_orders' of them"""
+  column_counts=[sum(grid[i][j] != '0' for i in range(9)) for j in range(9)]
+  row_keys=[(sum(c != '0' for c in grid[i]), sorted(column_counts[j] for j in range(9) if grid[i][j] != '0'))
+              for i in range(9)]
+  band_keys=[sorted(row_keys[i] for i in range(3*band, 3*band + 3)) for band in range(3)]
+  band_orders=tie_orders(range(3), lambda band: band_keys[band])
+  row_orders=[tie_orders(range(3*band, 3*band + 3), lambda i: row_keys[i]) for band in range(3)]
+  total=len(band_orders)
+  for orders in row_orders:
+    total *= len(orders)
+  if total > max_orders:
+    return None
+  return [sum(combination, ()) for bands in band_orders
+          for combination in itertools.product(*[row_orders[band] for band in bands])]
+
+
+def relabel(sudoku_string):
+  """Renames the numbers in order of first appearance (the first number
+  becomes 1, the next different one 2...). Returns the new string and the
+  mapping from old to new numbers, completed for the missing numbers"""
+  mapping={'0': '0'}
+  for c in sudoku_string:
+    if c not in mapping:
+      mapping[c]=str(len(mapping))
+  missing_new=[str(n) for n in range(len(mapping), 10)]
+  missing_old=[str(n) for n in range(1, 10) if str(n) not in mapping]
+  mapping.update(zip(missing_old, missing_new))
+  return ''.join(mapping[c] for c in sudoku_string), mapping
+
+
+def transpose(sudoku_string):
+  return ''.join(sudoku_string[9*j + i] for i in range(9) for j in range(9))
+
+
+def canonical_form(sudoku_string, max_orders=5000):
+  """Returns (canonical string, transform) or None if the sudoku has too many
+  symmetric candidates to examine (more than 'max_orders' row or column
+  orders). The transform is (transposed, row order, column order, mapping)"""
+  best=None
+  for transposed in (False, True):
+    s=transpose(sudoku_string) if transposed else sudoku_string
+    rows=[s[9*i:9*i + 9] for i in range(9)]
+    columns=[s[j::9] for j in range(9)]
+    row_orders=line_orders(rows, max_orders)
+    column_orders=line_orders(columns, max_orders)
+    if row_orders is None or column_orders is None or len(row_orders)*len(column_orders) > max_orders:
+      return None
+    for row_order in row_orders:
+      permuted_rows=[rows[i] for i in row_order]
+      for column_order in column_orders:
+        candidate=''.join(row[j] for row in permuted_rows for j in column_order)
+        candidate, mapping = relabel(candidate)
+        if best is None or candidate < best[0]:
+          best=(candidate, (transposed, row_order, column_order, mapping))
+  return best
+
+
+def from_canonical(canonical_string, transform):
+  """Applies the inverse of 'transform' to a string in canonical form (for
+  example a solution of the canonical sudoku)"""
+  transposed, row_order, column_order, mapping = transform
+  inverse={new: old for old, new in mapping.items()}
+  grid=[None]*81
+  for r in range(9):
+    for c in range(9):
+      grid[9*row_order[r] + column_order[c]]=inverse[canonical_string[9*r + c]]
+  s=''.join(grid)
+  return transpose(s) if transposed else s
+
+
+class SolutionCache:
+  """LRU cache of solutions in front of Sudoku.solve_sudoku. Sudokus seen
+  before exactly are answered from a first dictionary; otherwise the
+  canonical form is looked up. With 'path', the canonical entries are loaded
+  from and saved to a JSON file"""
+
+  def __init__(self, maxsize=100000, path=None, max_orders=5000):
+    self.maxsize=maxsize
+    self.path=path
+    self.max_orders=max_orders
+    self.exact=OrderedDict()
+    self.canonical=OrderedDict()
+    self.hits=0
+    self.misses=0
+    if path is not None and os.path.exists(path):
+      with open(path) as f:
+        self.canonical.update(json.load(f))
+      while len(self.canonical) > self.maxsize:
+        self.canonical.popitem(last=False)
+
+  def _store(self, table, key, value):
+    table[key]=value
+    table.move_to_end(key)
+    if len(table) > self.maxsize:
+      table.popitem(last=False)
+
+  def solve(self, sudoku_string):
+    """Same solutions as Sudoku(sudoku_string).solve_sudoku(False), always
+    as Solutions sorted in string order (the solutions of a variant come
+    out of its canonical form in another order than its own search), or
+    Outcome('Unsolvable'). Empty cells can be written as 0 or '.'. Each call
+    returns a new list, so changing it does not change the cache"""
+    if len(sudoku_string) == 81:
+      # Checked as Sudoku does, so that an invalid string is not relabeled
+      # into a valid sudoku
+      sudoku_string=''.join(sudoku_cells(sudoku_string))
+    if sudoku_string in self.exact:
+      self.hits += 1
+      self.exact.move_to_end(sudoku_string)
+      return self._result(self.exact[sudoku_string])
+    # Only the 9x9 sudokus are reduced to their canonical form
+    form=canonical_form(sudoku_string, self.max_orders) if len(sudoku_string) == 81 else None
+    if form is None:
+      self.misses += 1
+      solutions=Sudoku(sudoku_string).solve_sudoku(False)
+    else:
+      canonical_string, transform = form
+      if canonical_string in self.canonical:
+        self.hits += 1
+        self.canonical.move_to_end(canonical_string)
+        canonical_solutions=self.canonical[canonical_string]
+      else:
+        self.misses += 1
+        canonical_solutions=Sudoku(canonical_string).solve_sudoku(False)
+        self._store(self.canonical, canonical_string, canonical_solutions)
+      if canonical_solutions == 'Unsolvable':
+        solutions=canonical_solutions
+      else:
+        solutions=[from_canonical(solution, transform) for solution in canonical_solutions]
+    if solutions != 'Unsolvable':
+      solutions=tuple(sorted(solutions))
+    self._store(self.exact, sudoku_string, solutions)
+    return self._result(solutions)
+
+  def _result(self, solutions):
+    """Result of solve for the solutions kept in the cache: a tuple of
+    solutions or 'Unsolvable'"""
+    if solutions == 'Unsolvable':
+      return Outcome('Unsolvable')
+    return Solutions(solutions)
+
+  def save(self):
+    """Writes the canonical entries to the cache file"""
+    if self.path is None:
+      raise ValueError('The cache has no file to be saved to')
+    with open(self.path, 'w') as f:
+      json.dump(self.canonical, f)
+
+
+_default_cache=None
+
+
+def solve_cached(sudoku_string, cache=None):
+  """Solves a sudoku string through a SolutionCache (a module-wide one if
+  'cache' is not given)"""
+  global _default_cache
+  if cache is None:
+    if _default_cache is None:
+      _default_cache=SolutionCache()
+    cache=_default_cache
+  return cache.solve(sudoku_string)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Dancing Links (Knuth's Algorithm X) exact cover solver for sudokus. It does
+not explain the solution, it only finds it, so it is meant for the cases
+where just the solutions (or how many there are) are needed.
+
+The sudoku is modelled with 324 constraints (columns): each cell has one
+number, each row has each number, each column has each number and each box
+has each number. Each of the 729 options (rows) "number num+1 in cell (i,j)"
+satisfies exactly four of them.
+"""
+
+import sys
+
+CELL, ROW, COLUMN, BOX = 0, 81, 162, 243
+N_COLUMNS=324
+
+
+def option_columns(i, j, num):
+  """The four constraints satisfied by writing number num+1 in cell (i,j)"""
+  return (CELL + 9*i + j, ROW + 9*i + num, COLUMN + 9*j + num, BOX + 9*(3*(i//3) + j//3) + num)
+
+
+class DancingLinks:
+  """Toroidal doubly linked list of the exact cover matrix, stored in flat
+  integer lists: node 0 is the root, nodes 1..324 are the column headers and
+  the rest are the 1s of the matrix. For every node, L, R, U and D are its
+  neighbours, C its column header and O the option it belongs to. S is the
+  number of nodes of each column"""
+
+  _template=None
+
+  def __init__(self):
+    if DancingLinks._template is None:
+      DancingLinks._template=DancingLinks._build()
+    # The matrix is the same for every sudoku, copying it is cheaper than building it
+    self.L, self.R, self.U, self.D, self.C, self.O, self.S = [list(a) for a in DancingLinks._template]
+
+  @staticmethod
+  def _build():
+    header=N_COLUMNS + 1
+    L=[i - 1 for i in range(header)]
+    R=[i + 1 for i in range(header)]
+    L[0], R[-1] = N_COLUMNS, 0
+    U=list(range(header))
+    D=list(range(header))
+    C=list(range(header))
+    O=[-1]*header
+    S=[0]*header
+    for option in range(729):
+      i, j, num = option // 81, option // 9 % 9, option % 9
+      first=len(L)
+      for column in option_columns(i, j, num):
+        node=len(L)
+        column += 1
+        L.append(node - 1)
+        R.append(node + 1)
+        U.append(U[column])
+        D.append(column)
+        D[U[column]]=node
+        U[column]=node
+        C.append(column)
+        O.append(option)
+        S[column] += 1
+      L[first]=len(L) - 1
+      R[-1]=first
+    return L, R, U, D, C, O, S
+
+  def cover(self, c):
+    L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+    L[R[c]]=L[c]
+    R[L[c]]=R[c]
+    i=D[c]
+    while i != c:
+      j=R[i]
+      while j != i:
+        U[D[j]]=U[j]
+        D[U[j]]=D[j]
+        S[C[j]] -= 1
+        j=R[j]
+      i=D[i]
+
+  def uncover(self, c):
+    L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+    i=U[c]
+    while i != c:
+      j=L[i]
+      while j != i:
+        S[C[j]] += 1
+        U[D[j]]=j
+        D[U[j]]=j
+        j=L[j]
+      i=U[i]
+    L[R[c]]=c
+    R[L[c]]=c
+
+  def select(self, option):
+    """Takes an option as part of the solution from the start (a given
+    number). Returns False if it conflicts with an option already selected"""
+    first=1 + N_COLUMNS + 4*option
+    node=first
+    while True:
+      c=self.C[node]
+      if self.R[self.L[c]] != c:
+        return False  # the constraint has already been covered
+      node=self.R[node]
+      if node == first:
+        break
+    while True:
+      self.cover(self.C[node])
+      node=self.R[node]
+      if node == first:
+        return True
+
+  def search(self, partial, found, limit, budget=None):
+    """Depth-first search of exact covers. Appends each complete list of
+    options to 'found' and returns True once 'limit' of them have been found.
+    Every option tried is a node of the SearchBudget 'budget', if given, which
+    raises BudgetExceeded when one of its limits is reached"""
+    R, D, C, S = self.R, self.D, self.C, self.S
+    if R[0] == 0:
+      found.append(list(partial))
+      if budget is not None:
+        budget.solutions += 1
+      return limit is not None and len(found) >= limit
+    # Column with the fewest options left
+    c=R[0]
+    best, size = c, S[c]
+    while c != 0 and size > 1:
+      if S[c] < size:
+        best, size = c, S[c]
+      c=R[c]
+    if size == 0:
+      return False
+    self.cover(best)
+    r=D[best]
+    while r != best:
+      if budget is not None:
+        budget.check_node(len(partial))
+      partial.append(self.O[r])
+      j=R[r]
+      while j != r:
+        self.cover(C[j])
+        j=R[j]
+      if self.search(partial, found, limit, budget):
+        return True  # the structure is discarded, no need to restore it
+      j=self.L[r]
+      while j != r:
+        self.uncover(C[j])
+        j=self.L[j]
+      partial.pop()
+      r=D[r]
+    self.uncover(best)
+    return False
+
+
+def solve_dlx(sudoku_string, limit=None, budget=None):
+  """Solves an 81-character sudoku string. Returns 'Unsolvable' or the list of
+  solutions (at most 'limit' of them, all of them if limit is None), the same
+  contract as Sudoku.solve_sudoku. The search is limited by the SearchBudget
+  'budget', if given (see DancingLinks.search)"""
+  links=DancingLinks()
+  for index, char in enumerate(sudoku_string):
+    if char != '0' and not links.select(9*index + int(char) - 1):
+      return 'Unsolvable'
+  found=[]
+  if budget is not None:
+    # The links are allocated once; each level only adds an option to the
+    # partial cover and each solution is a list of 81 options
+    budget.state_bytes=8
+    budget.solution_bytes=sys.getsizeof([0]*81)
+  links.search([], found, limit, budget)
+  if len(found) == 0:
+    return 'Unsolvable'
+  solutions=[]
+  for options in found:
+    grid=list(sudoku_string)
+    for option in options:
+      grid[option // 9]=str(option % 9 + 1)
+    solutions.append(''.join(grid))
+  return solutions
+
+
+def count_solutions_dlx(sudoku_string, limit=None):
+  """Number of solutions of an 81-character sudoku string, counting at most
+  up to 'limit'"""
+  solutions=solve_dlx(sudoku_string, limit)
+  return 0 if solutions == 'Unsolvable' else len(solutions)
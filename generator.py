@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Sudoku generator. A random complete grid is filled in and its numbers are
+removed, in random order, as long as the sudoku keeps a unique solution.
+The result is graded by the hardest rule the solver needs to solve it:
+
+  easy     only the immediate rules (one place for a number, one number in a cell)
+  medium   pointing rows and columns
+  hard     obvious and hidden sets
+  fiendish fish (X-Wing, Swordfish, Jellyfish), XY-Wings, XYZ-Wings and
+           simple coloring
+  expert   back tracking
+
+The clues can be removed symmetrically (the pattern of givens is then
+symmetric) and the removal stops at a target number of clues.
+
+Usage:
+  python generator.py -n 1000 --grade hard --symmetry rotational -o hard.csv
+"""
+
+import argparse
+import csv
+import random
+import sys
+import time
+
+from Sudoku import BudgetExceeded, SearchBudget, Sudoku, grid_to_string, sudoku_cells
+
+GRADES=('easy', 'medium', 'hard', 'fiendish', 'expert')
+
+# Grade of the sudokus that need each rule of SolverStats
+RULE_GRADES={
+  'box_single': 'easy',
+  'row_single': 'easy',
+  'column_single': 'easy',
+  'cell_single': 'easy',
+  'pointing': 'medium',
+  'obvious_set': 'hard',
+  'hidden_set': 'hard',
+  'fish': 'fiendish',
+  'xy_wing': 'fiendish',
+  'xyz_wing': 'fiendish',
+  'simple_coloring': 'fiendish',
+}
+
+SYMMETRIES=('none', 'rotational', 'mirror', 'diagonal', 'dihedral')
+
+
+def fill(sudoku, rng, budget=None):
+  """Completes the sudoku in place trying the numbers of each cell in random
+  order. Returns the solution string or None if there is none. Every number
+  tried is a node of the SearchBudget 'budget', if given, which raises
+  BudgetExceeded when one of its limits is reached"""
+  if not sudoku.put_immediate_numbers():
+    return None
+  best=sudoku.branching_cell()
+  if best == -1:
+    return grid_to_string(sudoku.sudoku_grid)
+  i, j = best//sudoku.size, best%sudoku.size
+  numbers=list(sudoku.topology.numbers_in_mask[sudoku.candidates[best]])
+  rng.shuffle(numbers)
+  state=sudoku.save_state()
+  for num in numbers:
+    if budget is not None:
+      budget.check_node(0)
+    sudoku.place_number(i, j, num)
+    solution=fill(sudoku, rng, budget)
+    if solution is not None:
+      return solution
+    sudoku.restore_state(state)
+  return None
+
+
+def random_grid(rng, box_size=3):
+  """A random complete grid with boxes of box_size x box_size cells. Most
+  fills need about one node per cell, but with big boxes an unlucky start
+  can get lost in a long dead end: after 2 nodes per cell the fill is
+  started again with other random numbers, doubling the limit every time"""
+  max_nodes=2*box_size**4
+  while True:
+    try:
+      return fill(Sudoku('0'*box_size**4), rng, SearchBudget(max_nodes))
+    except BudgetExceeded:
+      max_nodes *= 2
+
+
+def orbits(size, symmetry):
+  """Groups of cells (flat indices) that are removed together to keep the
+  pattern of givens symmetric"""
+  if symmetry not in SYMMETRIES:
+    raise ValueError('symmetry must be one of ' + str(SYMMETRIES) + ', not ' + repr(symmetry))
+  last=size - 1
+  images={
+    'none': lambda i, j: [(i, j)],
+    'rotational': lambda i, j: [(i, j), (last - i, last - j)],
+    'mirror': lambda i, j: [(i, j), (i, last - j)],
+    'diagonal': lambda i, j: [(i, j), (j, i)],
+    'dihedral': lambda i, j: [(i, j), (j, last - i), (last - i, last - j), (last - j, i)],
+  }[symmetry]
+  seen=set()
+  groups=[]
+  for i in range(size):
+    for j in range(size):
+      if size*i + j not in seen:
+        group=sorted({size*a + b for a, b in images(i, j)})
+        seen.update(group)
+        groups.append(group)
+  return groups
+
+
+def cells_to_string(cells, size):
+  """Sudoku string of a list of cells (see Sudoku.sudoku_cells)"""
+  return ''.join(cells) if size <= 9 else ' '.join(cells)
+
+
+def is_forced(sudoku, index, num):
+  """Check if number num+1 is the only mark left in cell 'index' (a flat
+  index) or the cell is the only place left for it in its box, row or
+  column"""
+  bit=1 << num
+  candidates=sudoku.candidates
+  if candidates[index] == bit:
+    return True
+  t=sudoku.topology
+  for cells in (t.box_cells[t.box_of_cell[index]], t.row_cells[index//sudoku.size], t.column_cells[index%sudoku.size]):
+    if not any(candidates[cell] & bit for cell in cells if cell != index):
+      return True
+  return False
+
+
+def keeps_unique_solution(sudoku, removed, solution):
+  """Check if 'sudoku', with only its givens placed and the 'removed' cells
+  just emptied (see Sudoku.empty_cells), still has only the solution
+  'solution' (its list of cells). The sudoku is left partly solved. If the
+  givens left force the number of every removed cell (a single of the cell
+  or of one of its units), the solution is still the same without a search.
+  For a single cell it is enough to prove that it cannot hold another
+  number, which is a search for one solution instead of two"""
+  if all(is_forced(sudoku, index, int(solution[index]) - 1) for index in removed):
+    return True
+  if len(removed) == 1:
+    index=removed[0]
+    sudoku.remove_mark(index//sudoku.size, index%sudoku.size, int(solution[index]) - 1)
+    return sudoku.count_current_state(1) == 0
+  return sudoku.count_current_state(2) == 1
+
+
+def remove_clues(solution, rng, clues=0, symmetry='none'):
+  """Removes numbers of a complete grid (the list of its cells), in random
+  order and by groups of symmetric cells, while the solution stays unique,
+  until there are no more than 'clues' numbers. A group that would leave
+  fewer than 'clues' numbers is kept. Returns the list of cells of the
+  sudoku"""
+  cells=list(solution)
+  size=round(len(cells) ** 0.5)
+  groups=orbits(size, symmetry)
+  rng.shuffle(groups)
+  # A single sudoku is built: each group is emptied from the state of the
+  # numbers kept so far, which is restored after the test
+  sudoku=Sudoku(cells_to_string(cells, size))
+  kept=sudoku.save_state()
+  left=len(cells)
+  for group in groups:
+    if left <= clues:
+      break
+    if left - len(group) < clues:
+      continue
+    sudoku.restore_state(kept)
+    sudoku.empty_cells(group)
+    emptied=sudoku.save_state()
+    if keeps_unique_solution(sudoku, group, solution):
+      left -= len(group)
+      kept=emptied
+      for index in group:
+        cells[index]='0'
+  return cells
+
+
+def grade(sudoku_string):
+  """(grade, SolverStats) of a sudoku with a unique solution"""
+  stats=Sudoku(sudoku_string).solve_sudoku(False, stats=True, advanced=True).stats
+  if stats.branches > 0:
+    return 'expert', stats
+  level=0
+  for rule, rule_grade in RULE_GRADES.items():
+    if stats.fired[rule] > 0:
+      level=max(level, GRADES.index(rule_grade))
+  return GRADES[level], stats
+
+
+def generate_puzzle(rng, clues=0, symmetry='none', box_size=3):
+  """(sudoku, solution, grade) of a random sudoku with a unique solution"""
+  solution=random_grid(rng, box_size)
+  cells=remove_clues(sudoku_cells(solution), rng, clues, symmetry)
+  puzzle=cells_to_string(cells, box_size*box_size)
+  return puzzle, solution, grade(puzzle)[0]
+
+
+def generate(count, grades=None, clues=0, symmetry='none', seed=None, box_size=3, max_attempts=None):
+  """Yields 'count' tuples (sudoku, solution, grade) of random sudokus with
+  a unique solution, only of the given 'grades' if they are given. Gives up
+  after 'max_attempts' sudokus (100 per sudoku asked for by default)"""
+  rng=random.Random(seed)
+  if max_attempts is None:
+    max_attempts=100*count
+  produced=0
+  for _ in range(max_attempts):
+    if produced >= count:
+      return
+    puzzle, solution, level = generate_puzzle(rng, clues, symmetry, box_size)
+    if grades is None or level in grades:
+      produced += 1
+      yield puzzle, solution, level
+
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description='Generate graded sudokus with a unique solution')
+  parser.add_argument('-n', '--count', type=int, default=100, help='number of sudokus')
+  parser.add_argument('-o', '--output', help='output CSV file (standard output by default)')
+  parser.add_argument('--grade', action='append', choices=GRADES, help='grade of the sudokus (can be repeated)')
+  parser.add_argument('--clues', type=int, default=0, help='stop removing numbers at this number of clues')
+  parser.add_argument('--symmetry', choices=SYMMETRIES, default='none', help='symmetry of the pattern of clues')
+  parser.add_argument('--box-size', type=int, default=3, help='3 for 9x9 sudokus, 4 for 16x16...')
+  parser.add_argument('--seed', type=int, help='random seed')
+  args=parser.parse_args(argv)
+
+  output=open(args.output, 'w', newline='') if args.output else sys.stdout
+  writer=csv.writer(output)
+  writer.writerow(['quizzes', 'solutions', 'grade'])
+  start=time.time()
+  produced=0
+  try:
+    for puzzle, solution, level in generate(args.count, args.grade, args.clues, args.symmetry, args.seed, args.box_size):
+      writer.writerow([puzzle, solution, level])
+      produced += 1
+  finally:
+    if args.output:
+      output.close()
+  elapsed=time.time() - start
+  print(f'Generated {produced} sudokus in {elapsed:.2f} seconds ({60*produced/max(elapsed, 1e-9):.0f} sudokus/min)',
+        file=sys.stderr)
+  return 0 if produced == args.count else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Hints for a player solving a sudoku. A HintSession keeps the player's grid
+and its marks between requests: the moves of the player are applied
+incrementally and a hint only runs the rules until the first one that
+applies, instead of building and solving the whole sudoku again.
+
+  session=HintSession(puzzle)
+  session.place(0, 2, 4)           # the player writes 4 in cell (1,3)
+  step=session.next_step()         # {'rule': 'single', 'unit': 'box', ...}
+  print(render_step(step))
+
+The steps are the same dictionaries as the explanation of solve_sudoku (see
+render_step), with positions and numbers 0-based, plus 'wrong_number' for a
+number of the player that is not in the solution and 'unsolvable' for a grid
+without solution.
+"""
+
+from Sudoku import Sudoku, grid_to_string, string_to_grid
+
+
+class HintSession:
+  """Grid of a player and its marks. Cells are (i, j) with 0-based rows
+  and columns and numbers are written as on the grid (1 to 9)"""
+
+  def __init__(self, sudoku_string):
+    self.sudoku_string_original=sudoku_string
+    self.sudoku_grid_original=string_to_grid(sudoku_string)
+    self.sudoku=self._new_sudoku(sudoku_string)
+    self._original_state=self.sudoku.save_state()
+    self._moves=[]  # (i, j, number, state before it) of each number of the player, in order
+    self._solution=None
+    self._solvable=None  # whether the grid has a solution, None until it is checked
+
+  def _new_sudoku(self, sudoku_string):
+    sudoku=Sudoku(sudoku_string)
+    sudoku.PRINT_SUDOKUS=False
+    sudoku.RECORD_STEPS=True
+    sudoku.explain=True
+    sudoku.advanced=True
+    sudoku.steps=[]
+    return sudoku
+
+  @property
+  def sudoku_grid(self):
+    return self.sudoku.sudoku_grid
+
+  def sudoku_string(self):
+    return grid_to_string(self.sudoku.sudoku_grid)
+
+  def is_complete(self):
+    return self.sudoku.is_complete()
+
+  def _from_state(self, state, search):
+    """Result of search() run silently on the session's sudoku in 'state'.
+    The sudoku is left as it was"""
+    sudoku=self.sudoku
+    current=sudoku.save_state()
+    explain, advanced = sudoku.explain, sudoku.advanced
+    sudoku.explain=sudoku.advanced=False
+    sudoku.restore_state(state)
+    try:
+      return search()
+    finally:
+      sudoku.restore_state(current)
+      sudoku.explain, sudoku.advanced = explain, advanced
+
+  def solution(self):
+    """Grid of the solution of the original sudoku, or None if it does not
+    have exactly one. It is only looked for the first time it is needed:
+    the search stops at the second solution, and the sudoku is only solved
+    when it has exactly one"""
+    if self._solution is None:
+      self._solution=False
+      if self._from_state(self._original_state, lambda: self.sudoku.count_current_state(2)) == 1:
+        solutions=self._from_state(self._original_state, self.sudoku.solve_current_state)
+        self._solution=string_to_grid(solutions[0])
+    return self._solution or None
+
+  def is_solvable(self):
+    """Check if the current grid, with the marks removed so far, has a
+    solution. The search stops at the first one and the answer is kept
+    until the player writes or erases a number"""
+    if self._solvable is None:
+      self._solvable=self._from_state(self.sudoku.save_state(), lambda: self.sudoku.count_current_state(1)) > 0
+    return self._solvable
+
+  def place(self, i, j, number):
+    """Writes 'number' in the empty cell (i, j). Raises ValueError if the
+    cell is not empty or the number is already in its row, column or box"""
+    sudoku=self.sudoku
+    if not 1 <= number <= sudoku.size:
+      raise ValueError('Number ' + str(number) + ' out of range in a ' + str(sudoku.size) + 'x' + str(sudoku.size) + ' sudoku')
+    if sudoku.sudoku_grid[i][j] != '0':
+      raise ValueError('Cell (' + str(i+1) + ',' + str(j+1) + ') is not empty')
+    bit=1 << (number - 1)
+    if (sudoku.rows[i] | sudoku.columns[j] | sudoku.boxes[sudoku.topology.box_of_cell[sudoku.size*i + j]]) & bit:
+      raise ValueError('Number ' + str(number) + ' is already in the row, column or box of cell (' +
+                       str(i+1) + ',' + str(j+1) + ')')
+    self._moves.append((i, j, number, sudoku.save_state()))
+    sudoku.place_number(i, j, number - 1)
+    self._solvable=None
+
+  def erase(self, i, j):
+    """Empties cell (i, j), written by the player. The marks removed by the
+    number, or by the rules after it, cannot be put back one by one, so the
+    sudoku goes back to its state before the number was written and the
+    numbers written after it are placed again"""
+    if self.sudoku_grid_original[i][j] != '0':
+      raise ValueError('Cell (' + str(i+1) + ',' + str(j+1) + ') is a number of the original sudoku')
+    index=next((index for index, move in enumerate(self._moves) if move[:2] == (i, j)), None)
+    if index is None:
+      return
+    later=self._moves[index + 1:]
+    self.sudoku.restore_state(self._moves[index][3])
+    del self._moves[index:]
+    for move in later:
+      self._moves.append(move[:3] + (self.sudoku.save_state(),))
+      self.sudoku.place_number(move[0], move[1], move[2] - 1)
+    self._solvable=None
+
+  def next_step(self):
+    """Next logical step from the current grid, or None if it is complete.
+    A number of the player that is not in the solution is reported first
+    and a grid without solution is an 'unsolvable' step.
+    A number found by the rules is not written, so the same hint is given
+    until the player writes it; the marks removed by the rules are kept.
+    If no rule applies, the step is the 'branch' of the cell to guess"""
+    sudoku=self.sudoku
+    if sudoku.is_complete():
+      return None
+    # The numbers of the player are checked by looking for a solution of the
+    # grid from its current marks; the original sudoku alone needs no check
+    if sudoku.unsolvable() or (self._moves and not self.is_solvable()):
+      return self.wrong_number() or {'rule': 'unsolvable'}
+    sudoku.steps=[]
+    state=sudoku.save_state()
+    if sudoku.put_immediate_number():
+      sudoku.restore_state(state)
+      return sudoku.steps[-1]
+    if sudoku.update_marks():
+      return sudoku.steps[-1]
+    best=sudoku.branching_cell()
+    if best == -1:
+      # Every empty cell has a single mark left: it is a single of the cell
+      index=next(index for index, number in enumerate(cell for row in sudoku.sudoku_grid for cell in row)
+                   if number == '0')
+      return {'rule': 'single', 'unit': 'cell', 'cell': (index//sudoku.size, index%sudoku.size),
+              'number': sudoku.topology.numbers_in_mask[sudoku.candidates[index]][0]}
+    return {'rule': 'branch', 'cell': (best//sudoku.size, best%sudoku.size),
+            'numbers': list(sudoku.topology.numbers_in_mask[sudoku.candidates[best]])}
+
+  def wrong_number(self):
+    """'wrong_number' step of the first number of the player (in reading
+    order) that is not in the solution, or None. While the grid has a
+    solution every number of the player is in it, so the original sudoku is
+    only solved when the grid has none"""
+    if not self._moves or self.is_solvable():
+      return None
+    solution=self.solution()
+    if solution is None:
+      return None
+    original=self.sudoku_grid_original
+    for i, row in enumerate(self.sudoku.sudoku_grid):
+      for j, number in enumerate(row):
+        if number != '0' and original[i][j] == '0' and number != solution[i][j]:
+          return {'rule': 'wrong_number', 'cell': (i, j), 'number': int(number) - 1}
+    return None
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel search for the hardest sudokus. The first levels of the search tree
+are expanded in this process and the subtrees below them are searched in a
+pool of worker processes, which share a cancellation flag and a counter of
+the solutions found: as soon as the solutions needed have been found (one
+to solve a sudoku, two to know that it is not well-posed) every worker stops.
+
+  with ParallelSolver(workers=32) as solver:
+    solutions=solver.solve(sudoku_string)
+    unique=solver.has_unique_solution(sudoku_string)
+
+solve returns the same as Sudoku(sudoku_string).solve_sudoku(False). The
+parallel search proves that there is no solution or exactly one; for an
+ill-posed sudoku, whose list of solutions must be complete and in the same
+order, the sequential solver is used. There is no explanation of the steps.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Sudoku import Sudoku, Solutions, Outcome, grid_to_string
+
+# Shared by the workers of a pool, set by _init_worker
+_cancel=None
+_found=None
+_limit=None
+
+
+class _Cancelled(Exception):
+  """The solutions needed have already been found"""
+
+
+def _init_worker(cancel, found, limit):
+  global _cancel, _found, _limit
+  _cancel, _found, _limit = cancel, found, limit
+
+
+class SubtreeSudoku(Sudoku):
+  """Sudoku that counts its solutions in a worker: it stops when the shared
+  flag is set and adds every solution found to the shared counter, setting
+  the flag when the limit is reached. The first solution found is kept in
+  'solution'"""
+
+  def __init__(self, sudoku_string):
+    Sudoku.__init__(self, sudoku_string)
+    self.solution=None
+
+  def count_current_state(self, limit):
+    if _cancel.is_set():
+      raise _Cancelled()
+    return Sudoku.count_current_state(self, limit)
+
+  def branching_cell(self):
+    best=Sudoku.branching_cell(self)
+    if best == -1:  # count_current_state has completed the grid
+      if self.solution is None:
+        self.solution=grid_to_string(self.sudoku_grid)
+      with _found.get_lock():
+        _found.value += 1
+        if _found.value >= _limit.value:
+          _cancel.set()
+    return best
+
+
+def _count_subtree(sudoku_string, state, limit):
+  """Worker task: (number of solutions of the subtree at 'state', counting at
+  most up to 'limit', or None if it has been cancelled; first solution)"""
+  sudoku=SubtreeSudoku(sudoku_string)
+  sudoku.restore_state(state)
+  try:
+    count=sudoku.count_current_state(limit)
+  except _Cancelled:
+    count=None
+  return count, sudoku.solution
+
+
+def split(sudoku, parts, max_levels):
+  """Expands the search tree of the sudoku level by level, with the same
+  rules and choice of cells as Sudoku.count_solutions, until there are at
+  least 'parts' subtrees or 'max_levels' levels have been expanded. Returns
+  the states of the subtrees, in the order of the sequential search, and
+  the solutions completed along the way"""
+  frontier=[sudoku.save_state()]
+  solutions=[]
+  for _ in range(max_levels):
+    if len(frontier) >= parts:
+      break
+    expanded=[]
+    for state in frontier:
+      sudoku.restore_state(state)
+      if not sudoku.put_immediate_numbers():
+        continue
+      best=sudoku.branching_cell()
+      if best == -1:
+        solutions.append(grid_to_string(sudoku.sudoku_grid))
+        continue
+      i, j = best//sudoku.size, best%sudoku.size
+      branch_state=sudoku.save_state()
+      for num in sudoku.topology.numbers_in_mask[sudoku.candidates[best]]:
+        sudoku.place_number(i, j, num)
+        expanded.append(sudoku.save_state())
+        sudoku.restore_state(branch_state)
+    frontier=expanded
+  return frontier, solutions
+
+
+class ParallelSolver:
+  """Pool of 'workers' processes (os.cpu_count() by default) searching the
+  subtrees of one sudoku at a time. The tree is split into about
+  'parts_per_worker' subtrees per worker so that the load stays balanced"""
+
+  def __init__(self, workers=None, parts_per_worker=4, max_levels=8):
+    self.workers=workers or os.cpu_count()
+    self.parts=parts_per_worker*self.workers
+    self.max_levels=max_levels
+    context=multiprocessing.get_context()
+    self._cancel=context.Event()
+    self._found=context.Value('i', 0)
+    self._limit=context.Value('i', 0)
+    self._executor=ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(self._cancel, self._found, self._limit))
+
+  def close(self):
+    self._executor.shutdown()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def search(self, sudoku_string, limit):
+    """(number of solutions counting at most up to 'limit', first solution
+    found or None)"""
+    sudoku=Sudoku(sudoku_string)
+    frontier, solutions = split(sudoku, self.parts, self.max_levels)
+    if len(solutions) >= limit or not frontier:
+      return min(len(solutions), limit), (solutions[0] if solutions else None)
+    self._cancel.clear()
+    self._found.value=len(solutions)
+    self._limit.value=limit
+    futures=[self._executor.submit(_count_subtree, sudoku_string, state, limit) for state in frontier]
+    # Every task is waited for, so that none is left running for the next search
+    results=[future.result() for future in futures]
+    if any(count is None for count, _ in results):
+      count=limit
+    else:
+      count=min(len(solutions) + sum(count for count, _ in results), limit)
+    solutions += [solution for _, solution in results if solution is not None]
+    return count, (solutions[0] if solutions else None)
+
+  def count_solutions(self, sudoku_string, limit=2):
+    """Same as Sudoku(sudoku_string).count_solutions(limit)"""
+    return self.search(sudoku_string, limit)[0]
+
+  def has_unique_solution(self, sudoku_string):
+    return self.count_solutions(sudoku_string, 2) == 1
+
+  def solve(self, sudoku_string):
+    """Same result as Sudoku(sudoku_string).solve_sudoku(False)"""
+    count, solution = self.search(sudoku_string, 2)
+    if count == 0:
+      return Outcome('Unsolvable')
+    if count == 1:
+      return Solutions([solution])
+    return Sudoku(sudoku_string).solve_sudoku(False)
+
+
+def solve_parallel(sudoku_string, workers=None):
+  """Solves a sudoku string with a temporary ParallelSolver. To solve several
+  sudokus, keep a ParallelSolver instead, starting the pool costs more than
+  solving most sudokus"""
+  with ParallelSolver(workers) as solver:
+    return solver.solve(sudoku_string)
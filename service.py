@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous facade of the solver for servers running an asyncio event loop.
+The sudokus are solved in worker processes, so a long search never blocks the
+loop, and a search that takes longer than its timeout is stopped by killing
+its worker, which is replaced by a new one.
+
+  async with SolverService(workers=4) as service:
+    solutions=await service.solve(puzzle, timeout=2.0)
+
+or, with a service shared by the whole program:
+
+  solutions=await solve_async(puzzle, timeout=2.0, explain=True)
+
+The result is the same as Sudoku(puzzle).solve_sudoku(False, record_steps=explain).
+At most 'max_pending' different sudokus are admitted at once (being solved or
+waiting for a worker); beyond that ServiceBusy is raised, so that the caller
+can answer 'try later' instead of letting the queue and the latency grow.
+Concurrent requests of the same sudoku share a single solve. Each of them
+times out on its own, and the solve is stopped once all of them have given up,
+so it runs until the latest of their deadlines at most.
+
+Run as a script, it sends a load of test sudokus from a stand-in client and
+prints the latencies.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Sudoku import Sudoku, Solutions, Outcome
+
+
+class ServiceBusy(Exception):
+  """Raised when the service already has 'max_pending' sudokus admitted"""
+
+
+def _worker_main(conn):
+  """Loop of a worker process: receives (puzzle, explain), answers
+  ('ok', (solutions, steps)) or ('error', exception). None stops it"""
+  while True:
+    try:
+      request=conn.recv()
+    except EOFError:
+      return
+    if request is None:
+      return
+    puzzle, explain = request
+    try:
+      result=Sudoku(puzzle).solve_sudoku(False, record_steps=explain)
+      conn.send(('ok', (list(result) if isinstance(result, list) else str(result), result.steps)))
+    except Exception as error:
+      conn.send(('error', error))
+
+
+class _Worker:
+  """A worker process and the parent end of its pipe"""
+
+  def __init__(self, context):
+    self.conn, child_conn = context.Pipe()
+    self.process=context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+    self.process.start()
+    # Only the child keeps its end open, so that recv fails if it dies
+    child_conn.close()
+
+  def kill(self):
+    self.process.kill()
+    self.process.join()
+
+  def stop(self):
+    try:
+      self.conn.send(None)
+    except OSError:
+      pass
+    self.process.join()
+
+
+class _Job:
+  """Solve of a sudoku shared by the concurrent requests of it: the task
+  running it and the number of requests waiting for it"""
+
+  def __init__(self):
+    self.task=None
+    self.waiters=0
+
+
+class SolverService:
+  """Pool of 'workers' solver processes (os.cpu_count() by default) for an
+  asyncio program. 'max_pending' bounds the number of different sudokus
+  being solved or waiting for a worker"""
+
+  def __init__(self, workers=None, max_pending=100):
+    self.workers=workers or os.cpu_count()
+    self.max_pending=max_pending
+    self._context=multiprocessing.get_context('spawn')
+    self._idle=None
+    self._threads=None
+    self._all=[]
+    self._jobs={}  # (puzzle, explain) -> _Job of the solve in progress
+    self._stopping=set()  # tasks of the solves being stopped
+    self.coalesced=0
+    self.timeouts=0
+
+  async def start(self):
+    if self._idle is not None:
+      return
+    self._idle=asyncio.Queue()
+    # A thread waits for the answer of each worker and one more kills and
+    # replaces the workers, which must not wait for those
+    self._threads=ThreadPoolExecutor(max_workers=self.workers + 1)
+    for _ in range(self.workers):
+      self._add_worker()
+
+  async def close(self):
+    """Stops the workers once the jobs in progress are finished"""
+    if self._idle is None:
+      return
+    if self._jobs or self._stopping:
+      tasks=[job.task for job in self._jobs.values()] + list(self._stopping)
+      await asyncio.gather(*tasks, return_exceptions=True)
+    loop=asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(self._threads, worker.stop) for worker in self._all])
+    self._threads.shutdown()
+    self._idle=None
+    self._all=[]
+
+  async def __aenter__(self):
+    await self.start()
+    return self
+
+  async def __aexit__(self, *exc_info):
+    await self.close()
+
+  def _add_worker(self, worker=None):
+    worker=worker or _Worker(self._context)
+    self._all.append(worker)
+    self._idle.put_nowait(worker)
+
+  async def _replace_worker(self, worker):
+    """Kills a worker and starts a new one in the threads of the service:
+    waiting for a process to end or to start would block the loop"""
+    loop=asyncio.get_running_loop()
+    await loop.run_in_executor(self._threads, worker.kill)
+    self._all.remove(worker)
+    self._add_worker(await loop.run_in_executor(self._threads, _Worker, self._context))
+
+  async def solve(self, puzzle, timeout=None, explain=False):
+    """Solves a sudoku string in a worker. Returns the same as
+    Sudoku(puzzle).solve_sudoku(False, record_steps=explain). Raises
+    asyncio.TimeoutError if the result is not ready in 'timeout' seconds
+    (counting the wait for a worker) and ServiceBusy if the service is full.
+    A request for a sudoku that is already being solved waits for that solve,
+    with its own timeout. The solve is stopped, and its worker killed, when
+    every request waiting for it has timed out or been cancelled"""
+    await self.start()
+    key=(puzzle, explain)
+    job=self._jobs.get(key)
+    if job is not None:
+      self.coalesced += 1
+    else:
+      if len(self._jobs) >= self.max_pending:
+        raise ServiceBusy(str(len(self._jobs)) + ' sudokus pending')
+      job=_Job()
+      job.task=asyncio.ensure_future(self._run(puzzle, explain))
+      self._jobs[key]=job
+      job.task.add_done_callback(lambda task: self._finished(key, job))
+    job.waiters += 1
+    try:
+      # shield: the solve is only stopped here, when no other caller needs it
+      solutions, steps = await asyncio.wait_for(asyncio.shield(job.task), timeout)
+    except asyncio.TimeoutError:
+      self.timeouts += 1
+      raise
+    finally:
+      job.waiters -= 1
+      if job.waiters == 0 and not job.task.done():
+        self._stop(key, job)  # every caller has timed out or given up
+    if isinstance(solutions, list):
+      return Solutions(solutions, steps)
+    return Outcome(solutions, steps)
+
+  def _stop(self, key, job):
+    """Cancels a solve. It is no longer shared with new requests"""
+    if self._jobs.get(key) is job:
+      del self._jobs[key]
+    self._stopping.add(job.task)
+    job.task.cancel()
+
+  def _finished(self, key, job):
+    if self._jobs.get(key) is job:
+      del self._jobs[key]
+    self._stopping.discard(job.task)
+    if not job.task.cancelled():
+      job.task.exception()  # retrieved here in case every caller has given up
+
+  async def _run(self, puzzle, explain):
+    loop=asyncio.get_running_loop()
+    worker=await self._idle.get()
+    try:
+      worker.conn.send((puzzle, explain))
+      status, value = await loop.run_in_executor(self._threads, worker.conn.recv)
+    except asyncio.CancelledError:
+      # The search cannot be interrupted inside the worker: kill it
+      await self._replace_worker(worker)
+      raise
+    except (EOFError, OSError):
+      await self._replace_worker(worker)
+      raise RuntimeError('The solver process of ' + puzzle + ' died')
+    self._idle.put_nowait(worker)
+    if status == 'error':
+      raise value
+    return value
+
+
+_default_service=None
+
+
+async def solve_async(puzzle, timeout=None, explain=False):
+  """Solves a sudoku string through a SolverService shared by the whole
+  program, created on the first call. See SolverService.solve"""
+  global _default_service
+  if _default_service is None:
+    _default_service=SolverService()
+  return await _default_service.solve(puzzle, timeout, explain)
+
+
+async def _client(service, puzzles, clients, timeout):
+  """Stand-in client: 'clients' concurrent tasks sending the given sudokus.
+  Returns the latencies and the outcome of each request"""
+  queue=asyncio.Queue()
+  for puzzle in puzzles:
+    queue.put_nowait(puzzle)
+  latencies, outcomes = [], {'solved': 0, 'unsolvable': 0, 'timeout': 0, 'busy': 0}
+
+  async def client():
+    while not queue.empty():
+      puzzle=queue.get_nowait()
+      start=time.perf_counter()
+      try:
+        result=await service.solve(puzzle, timeout)
+        outcomes['unsolvable' if result == 'Unsolvable' else 'solved'] += 1
+      except asyncio.TimeoutError:
+        outcomes['timeout'] += 1
+      except ServiceBusy:
+        outcomes['busy'] += 1
+      latencies.append(time.perf_counter() - start)
+
+  await asyncio.gather(*[client() for _ in range(clients)])
+  return latencies, outcomes
+
+
+async def _demo():
+  from benchmark import TEST_PUZZLES, percentile
+  # An empty grid makes the rules solver look for all its solutions: a runaway
+  runaway='0'*81
+  puzzles=list(TEST_PUZZLES.values())*20 + [runaway]*3
+  async with SolverService(max_pending=50) as service:
+    start=time.perf_counter()
+    latencies, outcomes = await _client(service, puzzles, clients=32, timeout=1.0)
+    elapsed=time.perf_counter() - start
+    print(f'{len(puzzles)} requests in {elapsed:.2f} s with {service.workers} workers: {outcomes}')
+    print(f'coalesced {service.coalesced}, timeouts {service.timeouts}')
+    print(f'latency p50 {1000*percentile(latencies, 50):.1f} ms, p99 {1000*percentile(latencies, 99):.1f} ms, '
+          f'max {1000*max(latencies):.1f} ms')
+
+
+if __name__ == '__main__':
+  sys.exit(asyncio.run(_demo()))
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""The modules of the solver are at the root of the repository. The
+puzzles shared by the tests are the test puzzles and the corpora of the
+benchmark"""
+
+import json
+import os
+import sys
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark import TEST_PUZZLES
+
+with open(os.path.join(ROOT, 'benchmark_corpora.json')) as f:
+  CORPORA=json.load(f)
+
+PUZZLES=list(TEST_PUZZLES.values()) + [puzzle for puzzles in CORPORA.values() for puzzle in puzzles]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""The fish, wing and coloring tests: they only run when they are asked
+for, and the marks they remove are never the solution"""
+
+import random
+
+import pytest
+
+from Sudoku import Sudoku
+from conftest import PUZZLES
+from generator import generate_puzzle
+
+ADVANCED_RULES=('fish', 'xy_wing', 'xyz_wing', 'simple_coloring')
+
+# (puzzle, first step of the rule in the explanation of its solution)
+EXAMPLES={
+  'x_wing': ('000200080010030000572000100080406920000010000604002000000029074000004008030000290',
+             {'rule': 'fish', 'size': 2, 'number': 4, 'line': 'row', 'lines': [0, 3], 'cover_lines': [4, 8],
+              'removed': [(5, 4), (7, 4), (8, 4), (4, 8), (5, 8), (8, 8)]}),
+  'xy_wing': ('600250000058000000002040030013004000000600004800100007000020800000806971000000400',
+              {'rule': 'xy_wing', 'pivot': (3, 6), 'wings': [(2, 6), (5, 7)], 'number': 4, 'removed': [(5, 6)]}),
+  'xyz_wing': ('829040000000000064000030800000007000501900000002003756700200030040000910000600002',
+               {'rule': 'xyz_wing', 'pivot': (3, 4), 'wings': [(4, 5), (7, 4)], 'number': 7, 'removed': [(5, 4)]}),
+  'color_wrap': ('000000600620040700001300090000000030209500000085106000000002100076000050800000940',
+                 {'rule': 'simple_coloring', 'number': 6,
+                  'colors': [[(0, 3), (4, 5), (5, 8), (6, 4), (6, 7), (8, 3)], [(0, 5), (4, 7), (5, 4), (8, 8)]],
+                  'false_color': 0, 'removed': [(0, 3), (4, 5), (5, 8), (6, 4), (6, 7), (8, 3)]}),
+  'color_trap': ('829040000000000064000030800000007000501900000002003756700200030040000910000600002',
+                 {'rule': 'simple_coloring', 'number': 1,
+                  'colors': [[(1, 4), (2, 7), (4, 5)], [(1, 6), (2, 5), (3, 4)]],
+                  'false_color': None, 'removed': [(3, 7), (4, 6)]}),
+}
+
+
+def advanced_steps(puzzle):
+  """(steps of the advanced rules in the explanation of the solution of
+  'puzzle', its solution)"""
+  result=Sudoku(puzzle).solve_sudoku(False, record_steps=True)
+  assert len(result) == 1
+  return [step for step in result.steps if step['rule'] in ADVANCED_RULES], result[0]
+
+
+def removed_solutions(step, solution):
+  """Removed marks of a step that are the number of the solution"""
+  return [(i, j) for i, j in step['removed'] if int(solution[9*i + j]) == step['number'] + 1]
+
+
+@pytest.mark.parametrize('name', EXAMPLES)
+def test_rule_fires(name):
+  puzzle, expected = EXAMPLES[name]
+  steps, solution = advanced_steps(puzzle)
+  # The coloring examples are the first wrap or the first trap
+  step=next(step for step in steps if step['rule'] == expected['rule'] and
+            (step.get('false_color') is None) == (expected.get('false_color') is None))
+  assert step == expected
+  assert removed_solutions(step, solution) == []
+
+
+def test_generated_puzzles_keep_their_solution():
+  rng=random.Random(1)
+  removed=0
+  for _ in range(40):
+    puzzle, _, _ = generate_puzzle(rng)
+    steps, solution = advanced_steps(puzzle)
+    for step in steps:
+      assert removed_solutions(step, solution) == []
+      removed += len(step['removed'])
+  assert removed > 0
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_silent_solve_skips_advanced_rules(puzzle):
+  silent=Sudoku(puzzle).solve_sudoku(False, stats=True)
+  assert all(silent.stats.evaluated[rule] == 0 for rule in ADVANCED_RULES)
+  advanced=Sudoku(puzzle).solve_sudoku(False, advanced=True)
+  assert sorted(silent) == sorted(advanced)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""solve_batch gives the same results as solving each sudoku on its own"""
+
+from Sudoku import Sudoku
+from batch import propagate, puzzles_to_array, solve_batch
+from benchmark import TEST_PUZZLES
+from conftest import PUZZLES
+
+CONTRADICTORY='11' + '0'*79
+
+
+def test_same_results_as_sudoku():
+  puzzles=PUZZLES + [CONTRADICTORY]
+  # Written as they come from files: with dots, around spaces and line ends
+  puzzles=[puzzle.replace('0', '.') if k % 3 == 0 else puzzle + '\n' if k % 3 == 1 else ' ' + puzzle + ' '
+             for k, puzzle in enumerate(puzzles)]
+  results=solve_batch(puzzles, chunk_size=40)
+  expected=[Sudoku(puzzle).solve_sudoku(False) for puzzle in puzzles]
+  assert results == expected
+  assert [type(result) for result in results] == [type(result) for result in expected]
+  statuses={'Unsolvable' if result == 'Unsolvable' else min(len(result), 2) for result in results}
+  assert statuses == {'Unsolvable', 1, 2}
+
+
+def test_corpus_covers_propagation_and_search():
+  grids, contradictory = propagate(puzzles_to_array([TEST_PUZZLES['easy'], TEST_PUZZLES['difficult1'], CONTRADICTORY]))
+  complete=(grids != 0).all(axis=(1, 2))
+  assert list(complete) == [True, False, False]
+  assert list(contradictory) == [False, False, True]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Conversion of a CSV file with malformed rows to the binary format"""
+
+import os
+
+from benchmark import TEST_PUZZLES
+from binary_format import PuzzleFile, main
+
+EASY=TEST_PUZZLES['easy']
+EASY_SOLUTION='864371259325849761971265843436192587198657432257483916689734125713528694542916378'
+DIFFICULT=TEST_PUZZLES['difficult1']
+
+
+def test_malformed_rows_are_skipped(tmp_path):
+  path=tmp_path / 'sudoku.csv'
+  path.write_text('quizzes,solutions\n' + EASY + ',' + EASY_SOLUTION + '\n' + EASY[:80] + ',' + EASY_SOLUTION +
+                  '\n' + EASY + '\n' + EASY + ',' + EASY_SOLUTION + '\n')
+  output=tmp_path / 'sudoku.sdk'
+  assert main([str(path), str(output)]) == 1
+  with PuzzleFile(str(output)) as puzzles:
+    assert list(puzzles) == [(EASY, EASY_SOLUTION), (EASY, EASY_SOLUTION)]
+  assert sorted(os.listdir(tmp_path)) == ['sudoku.csv', 'sudoku.sdk']
+
+
+def test_round_trip_without_solutions(tmp_path):
+  path=tmp_path / 'sudoku.csv'
+  path.write_text('quizzes\n' + EASY + '\n' + DIFFICULT.replace('0', '.') + '\n')
+  output=tmp_path / 'sudoku.sdk'
+  assert main([str(path), str(output)]) == 0
+  back=tmp_path / 'back.csv'
+  assert main([str(output), str(back)]) == 0
+  assert back.read_text().split() == ['quizzes', EASY, DIFFICULT]
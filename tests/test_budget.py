@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Node, time and memory budgets of solve_sudoku with both engines"""
+
+import pytest
+
+from Sudoku import Outcome, SearchBudget, Solutions, Sudoku
+from benchmark import TEST_PUZZLES
+from conftest import CORPORA
+
+# An empty grid: listing all its solutions never ends
+RUNAWAY='0'*81
+
+LIMITS=[
+  {'max_nodes': 100},
+  {'max_time': 0.05},
+  {'max_memory': 20000},
+]
+
+
+@pytest.mark.parametrize('engine', ['rules', 'dlx'])
+@pytest.mark.parametrize('limits', LIMITS, ids=lambda limits: next(iter(limits)))
+def test_limit_stops_the_search(engine, limits):
+  sudoku=Sudoku(RUNAWAY)
+  state=sudoku.save_state()
+  result=sudoku.solve_sudoku(False, engine=engine, **limits)
+  assert isinstance(result, Outcome) and result == 'Budget exceeded'
+  assert isinstance(result.budget, SearchBudget)
+  assert result.budget.exceeded == next(iter(limits))
+  if 'max_nodes' in limits:
+    assert result.budget.nodes == limits['max_nodes'] + 1
+  # The sudoku is left as it was
+  assert sudoku.save_state() == state
+  assert sudoku.depth == 0
+
+
+@pytest.mark.parametrize('engine', ['rules', 'dlx'])
+def test_within_limits(engine):
+  puzzle=CORPORA['backtracking'][0]  # the rules engine has to branch
+  result=Sudoku(puzzle).solve_sudoku(False, engine=engine, max_nodes=100000, max_time=60, max_memory=10**8)
+  assert isinstance(result, Solutions)
+  assert result == Sudoku(puzzle).solve_sudoku(False)
+  assert result.budget.exceeded is None
+  assert result.budget.nodes > 0
+  assert result.budget.solutions == 1
+
+
+def test_no_budget_without_limits():
+  assert Sudoku(TEST_PUZZLES['easy']).solve_sudoku(False).budget is None
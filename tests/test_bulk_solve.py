@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Bulk solving of a CSV file with rows that are not sudokus"""
+
+import csv
+
+from benchmark import TEST_PUZZLES
+from bulk_solve import main, read_puzzles
+
+EASY=TEST_PUZZLES['easy']
+EASY_SOLUTION='864371259325849761971265843436192587198657432257483916689734125713528694542916378'
+
+
+def test_blank_and_short_rows(tmp_path):
+  path=tmp_path / 'sudoku.csv'
+  path.write_text('quizzes,solutions\n' + EASY + ',' + EASY_SOLUTION + '\n\n' + '123\n' + EASY + '\n')
+  assert list(read_puzzles(str(path))) == [(EASY, EASY_SOLUTION), ('123', None), (EASY, None)]
+
+  output=tmp_path / 'results.csv'
+  assert main([str(path), '-o', str(output), '--workers', '1', '--progress', '0']) == 1
+  with open(output, newline='') as f:
+    rows=list(csv.reader(f))
+  assert rows[0] == ['quizzes', 'solutions', 'status']
+  assert [(row[0], row[2]) for row in rows[1:]] == [(EASY, 'solved'), ('123', 'invalid'), (EASY, 'solved')]
+  assert rows[1][1] == rows[3][1] == EASY_SOLUTION
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""The variants of a sudoku by relabeling, transposition and permutations
+of rows, columns, bands and stacks share their canonical form, and the
+solutions of each variant are recovered from it"""
+
+import random
+
+import pytest
+
+from Sudoku import Sudoku
+from benchmark import TEST_PUZZLES
+from cache import SolutionCache, canonical_form, from_canonical, transpose
+
+EASY=TEST_PUZZLES['easy']
+# A 1 where the only solution of the easy sudoku has a 6
+UNSOLVABLE=EASY[0] + '1' + EASY[2:]
+PUZZLES={
+  'easy': EASY,
+  'difficult': TEST_PUZZLES['difficult4'],
+  'unsolvable': UNSOLVABLE,
+  'ill_posed': TEST_PUZZLES['ill_posed1'],
+}
+
+
+def line_permutation(rng):
+  """Order of the 9 rows (or columns): the bands are shuffled and so are the
+  rows inside each band"""
+  bands=rng.sample(range(3), 3)
+  return [3*band + row for band in bands for row in rng.sample(range(3), 3)]
+
+
+def random_transform(rng):
+  """Function applying a random symmetry of the sudoku to a string"""
+  rows, columns, transposed = line_permutation(rng), line_permutation(rng), rng.random() < 0.5
+  labels=dict(zip('123456789', rng.sample('123456789', 9)), **{'0': '0'})
+
+  def apply(sudoku_string):
+    s=transpose(sudoku_string) if transposed else sudoku_string
+    return ''.join(labels[s[9*i + j]] for i in rows for j in columns)
+  return apply
+
+
+def solutions_of(sudoku_string):
+  solutions=Sudoku(sudoku_string).solve_sudoku(False)
+  return solutions if solutions == 'Unsolvable' else sorted(solutions)
+
+
+@pytest.mark.parametrize('name', PUZZLES)
+def test_variants_round_trip(name):
+  puzzle=PUZZLES[name]
+  rng=random.Random(name)
+  canonical_string, _ = canonical_form(puzzle)
+  canonical_solutions=solutions_of(canonical_string)
+  solutions=solutions_of(puzzle)
+  assert (solutions == 'Unsolvable') == (name == 'unsolvable')
+  assert (solutions != 'Unsolvable' and len(solutions) > 1) == (name == 'ill_posed')
+  cache=SolutionCache()
+  cache.solve(puzzle)
+  for _ in range(20):
+    transform=random_transform(rng)
+    variant=transform(puzzle)
+    form=canonical_form(variant)
+    assert form[0] == canonical_string
+    assert from_canonical(form[0], form[1]) == variant
+    if solutions == 'Unsolvable':
+      assert canonical_solutions == 'Unsolvable'
+      assert cache.solve(variant) == 'Unsolvable'
+      continue
+    expected=sorted(transform(solution) for solution in solutions)
+    assert sorted(from_canonical(solution, form[1]) for solution in canonical_solutions) == expected
+    assert cache.solve(variant) == expected
+  # Every variant after the first sudoku is answered from the canonical entry
+  assert cache.misses == 1
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""count_solutions and the reuse of a sudoku after it: the state it
+restores must be usable by the solver"""
+
+import pytest
+
+from Sudoku import Sudoku
+from benchmark import TEST_PUZZLES
+from conftest import CORPORA, PUZZLES
+from dlx import solve_dlx
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_solve_after_count_solutions(puzzle):
+  sudoku=Sudoku(puzzle)
+  sudoku.count_solutions()
+  solutions, expected = sudoku.solve_sudoku(False), solve_dlx(puzzle)
+  if expected != 'Unsolvable':
+    solutions, expected = sorted(solutions), sorted(expected)
+  assert solutions == expected
+
+
+@pytest.mark.parametrize('puzzle', [puzzle for puzzles in CORPORA.values() for puzzle in puzzles])
+def test_corpus_is_unique(puzzle):
+  assert Sudoku(puzzle).count_solutions() == 1
+  assert Sudoku(puzzle).has_unique_solution()
+
+
+def test_ill_posed_and_contradictory():
+  assert Sudoku(TEST_PUZZLES['ill_posed1']).count_solutions() == 2
+  assert Sudoku(TEST_PUZZLES['ill_posed2']).count_solutions() == 2
+  assert not Sudoku(TEST_PUZZLES['ill_posed1']).has_unique_solution()
+  assert Sudoku('11' + '0'*79).count_solutions() == 0
+
+
+def test_limit():
+  # An empty grid has far too many solutions to be counted to the end
+  assert Sudoku('0'*81).count_solutions(5) == 5
+  assert Sudoku('0'*81).count_solutions(1) == 1
+  assert Sudoku(TEST_PUZZLES['ill_posed1']).count_solutions(1) == 1
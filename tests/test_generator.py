@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""Generated sudokus have a unique solution, the one they were made from"""
+
+from Sudoku import Sudoku
+from generator import GRADES, generate
+
+
+def test_generated_sudokus_are_unique():
+  for puzzle, solution, grade in generate(10, seed=1):
+    assert Sudoku(puzzle).count_solutions() == 1
+    assert Sudoku(puzzle).solve_sudoku(False) == [solution]
+    assert grade in GRADES
+
+
+def test_symmetric_sudokus_are_unique():
+  for puzzle, solution, _ in generate(5, seed=2, symmetry='rotational', clues=30):
+    assert Sudoku(puzzle).solve_sudoku(False) == [solution]
+    assert all((puzzle[k] == '0') == (puzzle[80 - k] == '0') for k in range(81))
+    assert sum(c != '0' for c in puzzle) >= 30
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Hints of a HintSession while the player writes and erases numbers"""
+
+import pytest
+
+from benchmark import TEST_PUZZLES
+from hints import HintSession
+
+EASY=TEST_PUZZLES['easy']
+EASY_SOLUTION='864371259325849761971265843436192587198657432257483916689734125713528694542916378'
+
+
+def solution_number(i, j):
+  return int(EASY_SOLUTION[9*i + j])
+
+
+def wrong_number(i, j):
+  """A number that can be written in cell (i, j) of EASY but is not its
+  solution"""
+  session=HintSession(EASY)
+  return next(number for number in session.sudoku.topology.numbers_in_mask[session.sudoku.candidates[9*i + j]]
+              if number + 1 != solution_number(i, j)) + 1
+
+
+def test_follow_the_hints_to_the_solution():
+  session=HintSession(EASY)
+  while True:
+    step=session.next_step()
+    if step is None:
+      break
+    assert step['rule'] == 'single'
+    i, j = step['cell']
+    assert step['number'] + 1 == solution_number(i, j)
+    assert session.next_step() == step  # not written until the player does
+    session.place(i, j, step['number'] + 1)
+  assert session.sudoku_string() == EASY_SOLUTION
+
+
+def test_wrong_number_and_erase():
+  session=HintSession(EASY)
+  first=session.next_step()
+  candidates=session.sudoku.candidates[:]
+  session.place(0, 1, wrong_number(0, 1))
+  assert session.next_step() == {'rule': 'wrong_number', 'cell': (0, 1), 'number': wrong_number(0, 1) - 1}
+  session.erase(0, 1)
+  assert session.sudoku.candidates == candidates
+  assert session.sudoku_string() == EASY
+  assert session.next_step() == first
+
+
+def test_erase_keeps_the_later_numbers():
+  session=HintSession(EASY)
+  session.place(0, 0, solution_number(0, 0))
+  session.place(0, 1, solution_number(0, 1))
+  session.place(8, 0, wrong_number(8, 0))
+  session.erase(0, 0)
+  grid=session.sudoku_grid
+  assert grid[0][0] == '0'
+  assert grid[0][1] == str(solution_number(0, 1))
+  assert grid[8][0] == str(wrong_number(8, 0))
+  assert session.next_step()['rule'] == 'wrong_number'
+  session.erase(8, 0)
+  assert session.next_step()['rule'] == 'single'
+
+
+def test_invalid_moves():
+  session=HintSession(EASY)
+  with pytest.raises(ValueError):
+    session.erase(0, 2)  # a number of the original sudoku
+  with pytest.raises(ValueError):
+    session.place(0, 2, 1)  # not empty
+  with pytest.raises(ValueError):
+    session.place(0, 0, 4)  # already in the row
+  with pytest.raises(ValueError):
+    session.place(0, 0, 10)
+
+
+def test_unsolvable():
+  assert HintSession('11' + '0'*79).next_step() == {'rule': 'unsolvable'}
+
+
+def test_sparse_grid_is_checked_once_per_move():
+  # Without its first row, difficult7 has a great many solutions
+  session=HintSession('0'*9 + TEST_PUZZLES['difficult7'][9:])
+  searches=[]
+  from_state=session._from_state
+  session._from_state=lambda state, search: searches.append(search) or from_state(state, search)
+  first=session.next_step()
+  assert searches == []  # the original sudoku needs no check
+  i, j = first['cell']
+  session.place(i, j, first['number'] + 1)
+  steps=[session.next_step() for _ in range(5)]
+  assert steps[0]['rule'] == 'single' and steps.count(steps[0]) == 5
+  assert len(searches) == 1
+  assert session.solution() is None
+  session.erase(i, j)
+  session.place(i, j, first['number'] + 1)
+  assert session.next_step() == steps[0]
+  assert len(searches) == 3  # one check after each move and the search of solution()
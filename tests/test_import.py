@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Import time of the solver, which every worker process pays when it starts"""
+
+import os
+import py_compile
+import subprocess
+import sys
+
+from benchmark import HEAVY_MODULES
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Milliseconds, the default --import-budget of benchmark.py
+IMPORT_BUDGET_MS=20.0
+
+
+def import_profile(module):
+  """-X importtime report of importing 'module' in a new interpreter: for
+  each imported module, its cumulative import time in milliseconds"""
+  result=subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                          capture_output=True, text=True, check=True, cwd=ROOT)
+  times={}
+  for line in result.stderr.splitlines():
+    if line.startswith('import time:') and '|' in line:
+      _, cumulative, name = line[len('import time:'):].split('|')
+      if cumulative.strip().isdigit():
+        times[name.strip()]=int(cumulative)/1000
+  return times
+
+
+def test_import_loads_no_heavy_modules():
+  times=import_profile('Sudoku')
+  assert 'Sudoku' in times
+  assert [module for module in times if module.split('.')[0] in HEAVY_MODULES] == []
+
+
+def test_import_time_within_budget():
+  # The bytecode is compiled first, the compilation is not measured
+  py_compile.compile(os.path.join(ROOT, 'Sudoku.py'))
+  best=min(import_profile('Sudoku')['Sudoku'] for _ in range(5))
+  assert best <= IMPORT_BUDGET_MS
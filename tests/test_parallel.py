@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""ParallelSolver gives the same results as the sequential solver"""
+
+import pytest
+
+from Sudoku import Sudoku
+from benchmark import TEST_PUZZLES
+from conftest import CORPORA
+from parallel import ParallelSolver
+
+PUZZLES=list(TEST_PUZZLES.values()) + CORPORA['backtracking']
+COUNTED={
+  'unique': TEST_PUZZLES['difficult7'],
+  'ill_posed': TEST_PUZZLES['ill_posed1'],
+  'contradictory': '11' + '0'*79,
+}
+
+
+@pytest.fixture(scope='module')
+def solver():
+  with ParallelSolver(workers=2) as solver:
+    yield solver
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_solve_as_sequential(solver, puzzle):
+  result=solver.solve(puzzle)
+  expected=Sudoku(puzzle).solve_sudoku(False)
+  assert result == expected
+  assert type(result) == type(expected)
+
+
+@pytest.mark.parametrize('name', COUNTED)
+def test_count_solutions_as_sequential(solver, name):
+  puzzle=COUNTED[name]
+  for limit in (1, 2, 3):
+    assert solver.count_solutions(puzzle, limit) == Sudoku(puzzle).count_solutions(limit)
+  assert solver.has_unique_solution(puzzle) == (name == 'unique')
+
+
+def test_stops_at_the_limit(solver):
+  # An empty grid has far too many solutions to be searched to the end
+  assert solver.count_solutions('0'*81, 2) == 2
+  assert solver.count_solutions('0'*81, 100) == 100
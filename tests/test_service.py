@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""SolverService with a small pool: timeouts, replacement of the workers,
+shared solves and admission control"""
+
+import asyncio
+
+import pytest
+
+from Sudoku import Sudoku
+from benchmark import TEST_PUZZLES
+from service import ServiceBusy, SolverService
+
+EASY=TEST_PUZZLES['easy']
+EASY_SOLUTION='864371259325849761971265843436192587198657432257483916689734125713528694542916378'
+# An empty grid: the rules solver would look for all its solutions
+RUNAWAY='0'*81
+# About 800 solutions, some tenths of a second to list them
+SLOW='0'*30 + EASY_SOLUTION[30:]
+
+
+def test_timeout_replaces_the_worker():
+  async def run():
+    async with SolverService(workers=1) as service:
+      worker=service._all[0]
+      with pytest.raises(asyncio.TimeoutError):
+        await service.solve(RUNAWAY, timeout=0.5)
+      assert await service.solve(EASY, timeout=30) == [EASY_SOLUTION]
+      assert service.timeouts == 1
+      assert len(service._all) == 1 and service._all[0] is not worker
+      assert not worker.process.is_alive()
+  asyncio.run(run())
+
+
+def test_concurrent_requests_share_a_solve():
+  async def run():
+    async with SolverService(workers=1) as service:
+      results=await asyncio.gather(service.solve(EASY, timeout=30), service.solve(EASY, timeout=30))
+      assert results == [[EASY_SOLUTION], [EASY_SOLUTION]]
+      assert service.coalesced == 1
+  asyncio.run(run())
+
+
+def test_a_waiter_timing_out_does_not_stop_the_others():
+  async def run():
+    async with SolverService(workers=1) as service:
+      impatient=asyncio.ensure_future(service.solve(SLOW, timeout=0.1))
+      patient=asyncio.ensure_future(service.solve(SLOW, timeout=60))
+      with pytest.raises(asyncio.TimeoutError):
+        await impatient
+      return await patient, service.coalesced
+  solutions, coalesced = asyncio.run(run())
+  assert coalesced == 1
+  assert sorted(solutions) == sorted(Sudoku(SLOW).solve_sudoku(False))
+
+
+def test_busy_beyond_max_pending():
+  async def run():
+    async with SolverService(workers=1, max_pending=1) as service:
+      runaway=asyncio.ensure_future(service.solve(RUNAWAY, timeout=0.5))
+      await asyncio.sleep(0)  # admitted
+      with pytest.raises(ServiceBusy):
+        await service.solve(EASY, timeout=30)
+      with pytest.raises(asyncio.TimeoutError):
+        await runaway
+      # The slot is free again once the runaway has been stopped
+      assert await service.solve(EASY, timeout=30) == [EASY_SOLUTION]
+  asyncio.run(run())
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Sudoku strings of every format and size: 4x4, 9x9 and 16x16"""
+
+import pytest
+
+from Sudoku import SYMBOLS, Sudoku, box_size_of, grid_to_string, string_to_grid, sudoku_cells
+from benchmark import TEST_PUZZLES
+
+# A complete 16x16 grid and a sudoku with a unique solution made from it
+GRID_16=[[str((4*(r%4) + r//4 + c) % 16 + 1) for c in range(16)] for r in range(16)]
+PUZZLE_16=[['0' if (7*r + 3*c) % 5 < 2 else GRID_16[r][c] for c in range(16)] for r in range(16)]
+
+
+def test_4x4():
+  sudoku=Sudoku('1.3.' '3..2' '.1..' '43.1')
+  assert sudoku.size == 4
+  assert sudoku.solve_sudoku(False) == ['1234341221434321']
+
+
+def test_9x9_formats():
+  puzzle=TEST_PUZZLES['easy']
+  cells=list(puzzle)
+  assert sudoku_cells(puzzle.replace('0', '.')) == cells
+  assert sudoku_cells(' '.join(puzzle)) == cells
+  assert sudoku_cells(','.join(puzzle)) == cells
+  assert sudoku_cells(' ' + puzzle + '\n') == cells
+
+
+def test_16x16_formats():
+  cells=[cell for row in PUZZLE_16 for cell in row]
+  spaced=grid_to_string(PUZZLE_16)
+  assert spaced == ' '.join(cells)
+  assert sudoku_cells(spaced) == cells
+  assert sudoku_cells(','.join(cells)) == cells
+  assert sudoku_cells(','.join('.' if cell == '0' else cell for cell in cells)) == cells
+  # One character per cell, with letters for the numbers above 9
+  symbols=''.join('0' if cell == '0' else SYMBOLS[int(cell) - 1] for cell in cells)
+  assert any(c.isalpha() for c in symbols)
+  assert sudoku_cells(symbols) == cells
+  assert sudoku_cells(symbols.lower()) == cells
+  assert string_to_grid(symbols) == PUZZLE_16
+
+
+def test_box_size():
+  assert [box_size_of(n) for n in (16, 81, 256, 625)] == [2, 3, 4, 5]
+  for n in (0, 80, 82, 100):
+    with pytest.raises(ValueError):
+      box_size_of(n)
+
+
+def test_invalid_strings():
+  with pytest.raises(ValueError):
+    Sudoku('1.3.' '3..2' '.1..' '43.5')  # 5 in a 4x4 sudoku
+  with pytest.raises(ValueError):
+    Sudoku(' '.join(['17'] + ['0']*255))  # 17 in a 16x16 sudoku
+  with pytest.raises(ValueError):
+    Sudoku('1'*80)
+  with pytest.raises(ValueError):
+    Sudoku(' '.join(['0']*100))
+
+
+def test_solve_16x16():
+  result=Sudoku(grid_to_string(PUZZLE_16)).solve_sudoku(False)
+  assert result == [grid_to_string(GRID_16)]